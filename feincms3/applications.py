@@ -1,26 +1,39 @@
+import asyncio
 import contextlib
+import copy
 import hashlib
 import itertools
 import re
 import sys
+import threading
+import time
 from collections import Counter, defaultdict
 from importlib import import_module
 from types import ModuleType
 
 from asgiref.local import Local
-from asgiref.sync import iscoroutinefunction
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from content_editor.models import Type
 from django.conf import settings
 from django.core.checks import Error, Info, Warning
 from django.core.exceptions import ValidationError
 from django.core.signals import request_finished
-from django.db import models
+from django.db import connections, models, transaction
 from django.db.models import Q, signals
-from django.urls import NoReverseMatch, include, path, re_path, reverse
+from django.urls import (
+    NoReverseMatch,
+    URLResolver,
+    get_resolver,
+    include,
+    re_path,
+    reverse,
+)
+from django.urls.resolvers import RoutePattern
 from django.utils.decorators import sync_and_async_middleware
 from django.utils.translation import get_language, gettext_lazy as _
 
 from feincms3.mixins import ChoicesCharField
+from feincms3.utils import metric, metrics_enabled
 
 
 __all__ = (
@@ -30,6 +43,7 @@ __all__ = (
     "apps_middleware",
     "apps_urlconf",
     "page_for_app_request",
+    "prebuild_apps_urlconf",
     "reverse_any",
     "reverse_app",
     "reverse_fallback",
@@ -64,11 +78,15 @@ def reverse_any(
         )
     """
 
-    for viewname in viewnames:
+    for attempt, viewname in enumerate(viewnames, 1):
         try:
-            return reverse(viewname, urlconf, args, kwargs, *fargs, **fkwargs)
+            url = reverse(viewname, urlconf, args, kwargs, *fargs, **fkwargs)
         except NoReverseMatch:
             pass
+        else:
+            metric("feincms3.reverse_any.attempts", attempt, found=True)
+            return url
+    metric("feincms3.reverse_any.attempts", len(viewnames), found=False)
     if fallback is not _sentinel:
         return fallback
     raise NoReverseMatch(
@@ -182,9 +200,46 @@ def _del_apps_urlconf_cache(**kwargs):
         del _apps_urlconf_cache.cache
 
 
+# The list of applications is cached for the duration of a request. asgiref's
+# Local is thread-local in sync code and local to the current task (or rather,
+# context) in async code; the cache isn't shared between concurrent requests
+# in either case.
 _apps_urlconf_cache = Local()
 request_finished.connect(_del_apps_urlconf_cache)
 
+# Loads of the list of applications in progress, one per event loop.
+_apps_urlconf_loads = {}
+
+
+def _cached_applications():
+    apps = getattr(_apps_urlconf_cache, "cache", None)
+    metric("feincms3.applications_cache", result="miss" if apps is None else "hit")
+    if apps is None:
+        apps = _APPS_MODEL._default_manager.active().applications()
+        # NOTE! We *could* cache the module_name instead but we'd still
+        # have to check if the module actually exists in the local Python
+        # process.
+        _apps_urlconf_cache.cache = apps
+    return apps
+
+
+async def _acached_applications():
+    apps = getattr(_apps_urlconf_cache, "cache", None)
+    metric("feincms3.applications_cache", result="miss" if apps is None else "hit")
+    if apps is None:
+        # Concurrent requests on the same event loop share one query instead
+        # of all hitting the database when the cache is cold.
+        loop = asyncio.get_running_loop()
+        if (load := _apps_urlconf_loads.get(loop)) is None:
+            load = loop.create_task(
+                _APPS_MODEL._default_manager.active().aapplications()
+            )
+            load.add_done_callback(lambda task: _apps_urlconf_loads.pop(loop, None))
+            _apps_urlconf_loads[loop] = load
+        apps = await asyncio.shield(load)
+        _apps_urlconf_cache.cache = apps
+    return apps
+
 
 def apps_urlconf(*, apps=None):
     """
@@ -215,17 +270,14 @@ def apps_urlconf(*, apps=None):
 
     The set of applications can be overridden by passing a list of
     ``(path, page_type, app_namespace, language_code)`` tuples.
+
+    Sites with many app pages should consider setting
+    :attr:`~feincms3.applications.PageTypeMixin.APPS_PREFIX_DISPATCH` on the
+    page class.
     """
 
     if apps is None:
-        apps = getattr(_apps_urlconf_cache, "cache", None)
-
-        if apps is None:
-            apps = _APPS_MODEL._default_manager.active().applications()
-            # NOTE! We *could* cache the module_name instead but we'd still
-            # have to check if the module actually exists in the local Python
-            # process.
-            _apps_urlconf_cache.cache = apps
+        apps = _cached_applications()
 
     if not apps:
         # No point wrapping ROOT_URLCONF if there are no additional URLs
@@ -235,77 +287,236 @@ def apps_urlconf(*, apps=None):
 
 
 async def apps_urlconf_async(*, apps=None):
+    """
+    Async version of :func:`~feincms3.applications.apps_urlconf`
+
+    Building a new URLconf module imports the URLconf modules of apps which
+    may block, so that happens in a worker thread and not on the event loop.
+    """
     if apps is None:
-        apps = getattr(_apps_urlconf_cache, "cache", None)
-
-        if apps is None:
-            fields = ("path", "page_type", "app_namespace", "language_code")
-            apps = [
-                row
-                async for row in _APPS_MODEL._default_manager.active()
-                .without_tree_fields()
-                .exclude(app_namespace="")
-                .values_list(*fields)
-                .order_by(*fields)
-            ]
-            # NOTE! We *could* cache the module_name instead but we'd still
-            # have to check if the module actually exists in the local Python
-            # process.
-            _apps_urlconf_cache.cache = apps
+        apps = await _acached_applications()
 
     if not apps:
         # No point wrapping ROOT_URLCONF if there are no additional URLs
         return settings.ROOT_URLCONF
 
-    return _build_apps_urlconf(apps)
+    if (module_name := _apps_urlconf_module_name(apps)) in sys.modules:
+        return module_name
+    return await sync_to_async(_build_apps_urlconf, thread_sensitive=False)(apps)
 
 
-def _build_apps_urlconf(apps):
+class _AppsResolver(URLResolver):
+    """
+    URL resolver for the app instances of a single language
+
+    Reports the time spent resolving if metrics are enabled.
+    """
+
+    def __init__(self, instances, **kwargs):
+        super().__init__(RoutePattern("", is_endpoint=False), instances, **kwargs)
+
+    def resolve(self, path):
+        if not metrics_enabled():
+            return self._resolve(path)
+        start = time.perf_counter()
+        try:
+            return self._resolve(path)
+        finally:
+            metric(
+                "feincms3.apps_urlconf.resolve",
+                time.perf_counter() - start,
+                namespace=self.namespace,
+            )
+
+    def _resolve(self, path):
+        return super().resolve(path)
+
+
+class _PrefixDispatchResolver(_AppsResolver):
+    """
+    URL resolver which only tries app instances whose path is a prefix of the
+    path being resolved
+
+    The default resolver tries the regular expression of every app instance in
+    turn; this one looks up the candidates in a dictionary keyed by the app
+    path, one lookup per path segment. Candidates are still tried in their
+    original order so that the results are the same as when using the default
+    resolver.
+    """
+
+    def __init__(self, instances, prefixes, **kwargs):
+        super().__init__(instances, **kwargs)
+        self._dispatch = defaultdict(list)
+        for index, prefix in enumerate(prefixes):
+            self._dispatch[prefix].append((index, instances[index]))
+
+    def _resolve(self, path):
+        path = str(path)
+        candidates = list(self._dispatch.get("", ()))
+        start = 0
+        while (end := path.find("/", start)) >= 0:
+            start = end + 1
+            candidates.extend(self._dispatch.get(path[:start], ()))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        resolver = copy.copy(self)
+        resolver.__dict__["url_patterns"] = [pattern for _i, pattern in candidates]
+        return URLResolver.resolve(resolver, path)
+
+
+def _apps_urlconf_module_name(apps):
     key = ",".join(itertools.chain.from_iterable(apps))
-    module_name = (
+    if _APPS_MODEL.APPS_PREFIX_DISPATCH:
+        key = f"prefix-dispatch:{key}"
+    return (
         "urlconf_%s"
         % hashlib.md5(key.encode("utf-8"), usedforsecurity=False).hexdigest()
     )
 
-    if module_name not in sys.modules:
-        types = {app.key: app for app in _APPS_MODEL.TYPES if app.get("urlconf")}
 
-        m = ModuleType(module_name)
+def _create_apps_urlconf_module(module_name, apps):
+    types = {app.key: app for app in _APPS_MODEL.TYPES if app.get("urlconf")}
 
-        mapping = defaultdict(list)
-        for app_path, page_type, app_namespace, language_code in apps:
-            if page_type not in types:
-                continue
-            mapping[language_code].append(
-                re_path(
-                    r"^%s" % re.escape(app_path.lstrip("/")),
-                    include(types[page_type]["urlconf"], namespace=app_namespace),
-                )
-            )
+    m = ModuleType(module_name)
 
-        m.urlpatterns = [
-            path(
-                "",
-                include(
-                    (instances, _APPS_MODEL.LANGUAGE_CODES_NAMESPACE),
-                    namespace=f"{_APPS_MODEL.LANGUAGE_CODES_NAMESPACE}-{language_code}",
-                ),
+    mapping = defaultdict(list)
+    prefixes = defaultdict(list)
+    for app_path, page_type, app_namespace, language_code in apps:
+        if page_type not in types:
+            continue
+        mapping[language_code].append(
+            re_path(
+                r"^%s" % re.escape(app_path.lstrip("/")),
+                include(types[page_type]["urlconf"], namespace=app_namespace),
             )
-            for language_code, instances in mapping.items()
-        ]
+        )
+        prefixes[language_code].append(app_path.lstrip("/"))
+
+    m.urlpatterns = [
+        _PrefixDispatchResolver(
+            instances,
+            prefixes[language_code],
+            app_name=_APPS_MODEL.LANGUAGE_CODES_NAMESPACE,
+            namespace=f"{_APPS_MODEL.LANGUAGE_CODES_NAMESPACE}-{language_code}",
+        )
+        if _APPS_MODEL.APPS_PREFIX_DISPATCH
+        else _AppsResolver(
+            instances,
+            app_name=_APPS_MODEL.LANGUAGE_CODES_NAMESPACE,
+            namespace=f"{_APPS_MODEL.LANGUAGE_CODES_NAMESPACE}-{language_code}",
+        )
+        for language_code, instances in mapping.items()
+    ]
 
-        # Append patterns from ROOT_URLCONF instead of including them because
-        # i18n_patterns only work in the root URLconf.
-        urlconf = import_module(settings.ROOT_URLCONF)
-        m.urlpatterns += urlconf.urlpatterns
-        for attribute in ["handler400", "handler403", "handler404", "handler500"]:
-            if hasattr(urlconf, attribute):
-                setattr(m, attribute, getattr(urlconf, attribute))
-        sys.modules[module_name] = m
+    # Append patterns from ROOT_URLCONF instead of including them because
+    # i18n_patterns only work in the root URLconf.
+    urlconf = import_module(settings.ROOT_URLCONF)
+    m.urlpatterns += urlconf.urlpatterns
+    for attribute in ["handler400", "handler403", "handler404", "handler500"]:
+        if hasattr(urlconf, attribute):
+            setattr(m, attribute, getattr(urlconf, attribute))
+    return m
+
+
+# Names of the apps URLconf modules built by this process
+_apps_urlconf_modules = set()
+# Locks for building apps URLconf modules, one per module name
+_apps_urlconf_locks = defaultdict(threading.Lock)
+_apps_urlconf_locks_lock = threading.Lock()
+
+
+def _build_apps_urlconf(apps):
+    module_name = _apps_urlconf_module_name(apps)
+    if module_name in sys.modules:
+        return module_name
+
+    # Only one thread builds a particular module, the others wait for the
+    # result instead of racing to build and register the same module.
+    with _apps_urlconf_locks_lock:
+        lock = _apps_urlconf_locks[module_name]
+    with lock:
+        if module_name not in sys.modules:
+            start = time.perf_counter()
+            sys.modules[module_name] = _create_apps_urlconf_module(module_name, apps)
+            _apps_urlconf_modules.add(module_name)
+            metric("feincms3.apps_urlconf.build", time.perf_counter() - start)
+            metric("feincms3.apps_urlconf.modules", len(_apps_urlconf_modules))
+    with _apps_urlconf_locks_lock:
+        _apps_urlconf_locks.pop(module_name, None)
 
     return module_name
 
 
+def prebuild_apps_urlconf():
+    """
+    Builds the apps URLconf module and populates Django's URL resolver for it
+
+    The first request handled by a new worker process otherwise has to pay for
+    importing ``ROOT_URLCONF`` and the URLconf modules of all apps, and for
+    populating the resolver. This function can be called before the worker
+    starts accepting requests, for example in gunicorn's ``post_worker_init``
+    server hook in ``gunicorn.conf.py``:
+
+    .. code-block:: python
+
+        def post_worker_init(worker):
+            from feincms3.applications import prebuild_apps_urlconf
+
+            prebuild_apps_urlconf()
+
+    Returns the name of the URLconf module.
+    """
+    try:
+        urlconf = apps_urlconf()
+        # Accessing the reverse dictionary imports all URLconf modules and
+        # compiles the patterns for the active language.
+        get_resolver(urlconf).reverse_dict  # noqa: B018
+        return urlconf
+    finally:
+        # Outside the request-response cycle nobody else resets the cache of
+        # applications or closes the database connection.
+        _del_apps_urlconf_cache()
+        connections.close_all()
+
+
+class _Prebuilds:
+    """
+    At most one pending and one running prebuild per process
+
+    Saving a page with many descendants sends many ``post_save`` signals; all
+    of them are served by a single background thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = False
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            self.pending = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.thread = None
+                    return
+                self.pending = False
+            try:
+                prebuild_apps_urlconf()
+            except BaseException:
+                with self.lock:
+                    self.thread = None
+                raise
+
+
+_prebuilds = _Prebuilds()
+
+
 def page_for_app_request(request, *, queryset=None):
     """
     Returns the current page if we're inside an app. Should only be called
@@ -525,6 +736,18 @@ class PageTypeMixin(models.Model):
     #: Override this to set a different name for the outer namespace.
     LANGUAGE_CODES_NAMESPACE = "apps"
 
+    #: Set this to ``True`` to dispatch requests to app instances using a
+    #: dictionary keyed by app paths instead of trying the regular expression
+    #: of each app instance in turn. Resolving is then proportional to the
+    #: depth of the requested path instead of the number of app pages, which
+    #: is worth it on sites with many (hundreds or thousands of) app pages.
+    APPS_PREFIX_DISPATCH = False
+
+    #: Set this to ``True`` to build the apps URLconf module in a background
+    #: thread after pages have been saved or deleted so that the next request
+    #: doesn't have to pay for building the module.
+    APPS_URLCONF_PREBUILD = False
+
     page_type = ChoicesCharField(_("page type"), max_length=100)
     app_namespace = models.CharField(
         ("app instance namespace"), max_length=100, blank=True, editable=False
@@ -542,6 +765,37 @@ class PageTypeMixin(models.Model):
 
     save.alters_data = True
 
+    @staticmethod
+    def recommended_indexes(*, name="%(app_label)s_%(class)s_apps"):
+        """
+        Return indexes for the lookups done by :mod:`feincms3.applications`
+
+        - A composite index on ``(language_code, app_namespace)`` for
+          :func:`~feincms3.applications.page_for_app_request` and the app
+          namespace uniqueness check in ``clean_fields``.
+        - A partial covering index named ``name`` for the list of active
+          applications used when building the apps URLconf.
+
+        Lookups by ``path`` use the unique index on ``path`` added by
+        :class:`~feincms3.pages.AbstractPage` and do not need an additional
+        index. Add the indexes to your page class like this::
+
+            class Page(AbstractPage, PageTypeMixin, LanguageMixin):
+                class Meta(AbstractPage.Meta):
+                    indexes = PageTypeMixin.recommended_indexes()
+
+        Partial indexes are only created on databases supporting them
+        (e.g. PostgreSQL and SQLite).
+        """
+        return [
+            models.Index(fields=["language_code", "app_namespace"]),
+            models.Index(
+                fields=["path", "page_type", "app_namespace", "language_code"],
+                condition=Q(is_active=True) & ~Q(app_namespace=""),
+                name=name,
+            ),
+        ]
+
     @property
     def type(self):
         """
@@ -619,6 +873,21 @@ class PageTypeMixin(models.Model):
             global _APPS_MODEL  # noqa: PLW0603 allow updating the global variable
             _APPS_MODEL = sender
 
+    @staticmethod
+    def schedule_apps_urlconf_prebuild(sender, **kwargs):
+        """
+        Builds the apps URLconf module in a background thread after the
+        current transaction has been committed if the page class has set
+        ``APPS_URLCONF_PREBUILD``. This method is a receiver of Django's
+        ``post_save`` and ``post_delete`` signals.
+        """
+        if (
+            issubclass(sender, PageTypeMixin)
+            and not sender._meta.abstract
+            and sender.APPS_URLCONF_PREBUILD
+        ):
+            transaction.on_commit(_prebuilds.start)
+
     @classmethod
     def check(cls, **kwargs):
         errors = super().check(**kwargs)
@@ -689,3 +958,5 @@ class PageTypeMixin(models.Model):
 
 
 signals.class_prepared.connect(PageTypeMixin.fill_page_type_choices)
+signals.post_save.connect(PageTypeMixin.schedule_apps_urlconf_prebuild)
+signals.post_delete.connect(PageTypeMixin.schedule_apps_urlconf_prebuild)
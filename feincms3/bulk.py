@@ -0,0 +1,176 @@
+"""
+Bulk import and export of page trees
+
+Saving pages one by one is slow when migrating large page trees from another
+CMS: ``AbstractPage.save()`` computes the ``path``, may walk descendants and
+sends signals for each page. :func:`import_pages` computes positions, paths
+and active states of a whole tree in memory instead and inserts the pages
+using ``bulk_create``, one level of the tree after the other.
+:func:`export_pages` produces records in the format expected by
+:func:`import_pages`.
+
+Records are dictionaries mapping field names to values. Foreign keys are
+represented by primary keys. Pages may be nested using a list of records in
+``children``; alternatively, records may reference the ``id`` of an earlier
+record using ``parent``, which is what :func:`export_pages` produces. Values of
+other foreign keys to the page model (for example ``translation_of``) which
+reference the ``id`` of an imported record are remapped to the primary key of
+the inserted page.
+
+The management commands ``feincms3_import_pages`` and
+``feincms3_export_pages`` read and write JSON or JSON lines files containing
+such records.
+"""
+
+from django.db import transaction
+from django.db.models import Max
+
+from feincms3.applications import PageTypeMixin
+
+
+def import_pages(model, records, *, parent=None, batch_size=1000):
+    """
+    Insert pages described by ``records`` using ``bulk_create`` and return
+    the number of inserted pages
+
+    Root records are added as children of ``parent`` if given. Records
+    without a ``position`` are ordered after their existing siblings in the
+    order in which they appear. Records are neither validated nor are any
+    signals sent; the unique index on ``path`` still has to hold, of course.
+    """
+    importer = _PageImporter(model)
+    for record in records:
+        if (key := record.get("parent")) is None:
+            importer.add(record, parent, 0)
+        elif key in importer.pages:
+            page, depth = importer.pages[key]
+            importer.add(record, page, depth + 1)
+        else:
+            raise ValueError(
+                f"The parent {key!r} of a record has to be imported before the"
+                " record itself."
+            )
+    return importer.insert(batch_size=batch_size)
+
+
+class _PageImporter:
+    def __init__(self, model):
+        self.model = model
+        self.fields = {field.name: field for field in model._meta.concrete_fields}
+        self.pk_name = model._meta.pk.name
+        self.references = [
+            field
+            for field in self.fields.values()
+            if field.is_relation
+            and field.related_model is model._meta.concrete_model
+            and field.name != "parent"
+        ]
+        self.levels = []
+        self.pages = {}
+        self.positions = {}
+        self.remap = []
+
+    def add(self, record, parent, depth):
+        page = self.page(record)
+        page.parent = parent
+        if not page.position:
+            page.position = self.next_position(parent)
+        if not page.static_path:
+            page.path = f"{parent.path if parent else '/'}{page.slug}/"
+        if parent is not None and not parent.is_active:
+            page.is_active = False
+        if isinstance(page, PageTypeMixin):
+            page.app_namespace = page.type.app_namespace(page)
+
+        if len(self.levels) <= depth:
+            self.levels.append([])
+        self.levels[depth].append(page)
+        if (key := record.get(self.pk_name)) is not None:
+            self.pages[key] = (page, depth)
+
+        for child in record.get("children") or ():
+            self.add(child, page, depth + 1)
+
+    def page(self, record):
+        values = {
+            name: value
+            for name, value in record.items()
+            if name not in {self.pk_name, "parent", "children"}
+        }
+        if unknown := set(values) - set(self.fields):
+            raise ValueError(f"Unknown fields {sorted(unknown)!r}.")
+
+        page = self.model()
+        for name, value in values.items():
+            field = self.fields[name]
+            if field in self.references:
+                # Set after inserting all pages
+                if value is not None:
+                    self.remap.append((page, field.attname, value))
+            elif field.is_relation:
+                setattr(page, field.attname, value)
+            else:
+                setattr(page, field.attname, field.to_python(value))
+        return page
+
+    def next_position(self, parent):
+        key = id(parent)
+        if key not in self.positions:
+            self.positions[key] = (
+                0
+                if parent is not None and parent.pk is None
+                else self.model._default_manager.filter(parent=parent)
+                .order_by()
+                .aggregate(position=Max("position"))["position"]
+                or 0
+            )
+        self.positions[key] += 10
+        return self.positions[key]
+
+    def insert(self, *, batch_size):
+        manager = self.model._base_manager
+        with transaction.atomic(using=manager.db):
+            # Parents are inserted before their children; bulk_create fills in
+            # the primary keys which are then used for the parent foreign keys.
+            for level in self.levels:
+                manager.bulk_create(level, batch_size=batch_size)
+
+            for page, attname, key in self.remap:
+                setattr(
+                    page,
+                    attname,
+                    self.pages[key][0].pk if key in self.pages else key,
+                )
+            if self.remap:
+                manager.bulk_update(
+                    list({id(page): page for page, *_rest in self.remap}.values()),
+                    [field.name for field in self.references],
+                    batch_size=batch_size,
+                )
+
+        self.model.bump_tree_version()
+        return sum(len(level) for level in self.levels)
+
+
+def export_pages(queryset, *, chunk_size=2000):
+    """
+    Yield records for all pages in ``queryset`` in tree order
+
+    Pages are fetched using ``values()`` and ``iterator()`` without
+    instantiating model instances or loading the whole tree at once. The
+    records of parents which aren't a part of ``queryset`` are missing, so
+    the ``parent`` of such pages is exported as ``None``.
+    """
+    model = queryset.model
+    fields = model._meta.concrete_fields
+    pk_attname = model._meta.pk.attname
+    seen = set()
+    for row in (
+        queryset.with_tree_fields()
+        .values(*[field.attname for field in fields])
+        .iterator(chunk_size=chunk_size)
+    ):
+        seen.add(row[pk_attname])
+        if row["parent_id"] not in seen:
+            row["parent_id"] = None
+        yield {field.name: row[field.attname] for field in fields}
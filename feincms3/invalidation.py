@@ -0,0 +1,148 @@
+"""
+Invalidation of process-local caches
+
+feincms3 keeps several caches in the memory of each process, e.g. page tree
+snapshots, the caches of the root middleware and the map of redirects. All of
+them have to notice when pages are changed in another process. This module
+offers namespaced version stamps stored in Django's default cache for this.
+
+Each process keeps the stamps it knows about in memory and fetches all of
+them using a single ``get_many`` call at most every
+``FEINCMS3_INVALIDATION_INTERVAL`` milliseconds (100 by default; 0 fetches
+them each time). A request therefore costs at most one cache read for all
+caches of feincms3, no matter how many of them are consulted. Changes made in
+the current process are visible immediately, changes made in other processes
+after at most the interval.
+
+Other processes only notice changes if the default cache is shared between
+all processes, e.g. when using the Redis, Memcached or database cache
+backends. The ``LocMemCache`` used by Django when ``CACHES`` isn't configured
+is local to each process; with several worker processes, caches of feincms3
+in one worker would never notice changes made in another worker. A system
+check warns about this (``feincms3.W008``) unless ``DEBUG`` is enabled. If
+the default cache doesn't store anything at all, e.g. when using the
+``DummyCache``, :func:`version` returns ``None`` and all caches depending on
+version stamps are disabled (``feincms3.W009``).
+
+.. code-block:: python
+
+    from feincms3 import invalidation
+
+    def expensive_thing():
+        version = invalidation.version("expensive-thing")
+        if (cached := _cache.get("thing")) and cached[0] == version:
+            return cached[1]
+        ...
+
+    # When the data changes:
+    invalidation.bump("expensive-thing")
+"""
+
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+
+class _State:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = {}
+        self.polled = None
+
+
+_state = _State()
+
+
+def _key(namespace):
+    return f"feincms3-version-{namespace}"
+
+
+def _interval():
+    return getattr(settings, "FEINCMS3_INVALIDATION_INTERVAL", 100) / 1000
+
+
+def version(namespace):
+    """
+    Return the current version stamp of ``namespace``
+
+    Returns ``None`` if the default cache doesn't store anything. Callers
+    should not cache anything in this case.
+    """
+    now = time.monotonic()
+    with _state.lock:
+        if (
+            _state.polled is not None
+            and now - _state.polled < _interval()
+            and (current := _state.versions.get(namespace)) is not None
+        ):
+            return current
+        namespaces = {*_state.versions, namespace}
+
+    values = cache.get_many([_key(name) for name in namespaces])
+    versions = {name: values.get(_key(name)) for name in namespaces}
+    for name, value in versions.items():
+        if value is None:
+            # Initialize the stamp; another process may have been faster.
+            cache.add(_key(name), uuid.uuid4().hex, None)
+            versions[name] = cache.get(_key(name))
+
+    with _state.lock:
+        _state.versions.update(versions)
+        _state.polled = now
+    return versions[namespace]
+
+
+def bump(namespace):
+    """
+    Change the version stamp of ``namespace``
+    """
+    value = uuid.uuid4().hex
+    cache.set(_key(namespace), value, None)
+    with _state.lock:
+        _state.versions[namespace] = value
+
+
+def reset():
+    """
+    Forget all locally known version stamps, e.g. after clearing the cache in
+    tests
+    """
+    with _state.lock:
+        _state.versions.clear()
+        _state.polled = None
+
+
+@checks.register(checks.Tags.caches)
+def check_default_cache(**kwargs):
+    """
+    Warn if version stamps cannot be shared between processes
+    """
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get("BACKEND", "")
+    if backend == "django.core.cache.backends.locmem.LocMemCache":
+        return [
+            checks.Warning(
+                "The default cache is local to each process, other processes"
+                " will not notice changes to pages.",
+                hint=(
+                    "Use a cache shared between processes as the default cache"
+                    " or silence this warning if only a single process is used."
+                ),
+                id="feincms3.W008",
+            )
+        ]
+    if backend == "django.core.cache.backends.dummy.DummyCache":
+        return [
+            checks.Warning(
+                "The default cache doesn't store anything, all caches of"
+                " feincms3 depending on version stamps are disabled.",
+                hint="Use a cache shared between processes as the default cache.",
+                id="feincms3.W009",
+            )
+        ]
+    return []
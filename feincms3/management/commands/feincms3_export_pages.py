@@ -0,0 +1,39 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from feincms3.bulk import export_pages
+
+
+class Command(BaseCommand):
+    help = "Export a page tree to JSON lines (or JSON) in tree order."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="The page model, e.g. pages.Page")
+        parser.add_argument("--format", choices=["json", "jsonl"], default="jsonl")
+        parser.add_argument(
+            "--root", type=int, help="Only export the subtree of this page"
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *, model, format, root, chunk_size, **options):
+        try:
+            model = apps.get_model(model)
+        except (LookupError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        queryset = model._default_manager.all()
+        if root is not None:
+            queryset = queryset.descendants(
+                model._default_manager.get(pk=root), include_self=True
+            )
+
+        encoder = DjangoJSONEncoder()
+        separator = "" if format == "jsonl" else "["
+        for record in export_pages(queryset, chunk_size=chunk_size):
+            if format == "jsonl":
+                self.stdout.write(encoder.encode(record))
+            else:
+                self.stdout.write(separator + encoder.encode(record))
+                separator = ","
+        if format == "json":
+            self.stdout.write("[]" if separator == "[" else "]")
@@ -0,0 +1,53 @@
+import json
+import sys
+from contextlib import nullcontext
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from feincms3.bulk import import_pages
+
+
+class Command(BaseCommand):
+    help = "Import a page tree from a JSON or JSON lines file in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="The page model, e.g. pages.Page")
+        parser.add_argument("file", help="The file to read, - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=["json", "jsonl"],
+            help="Defaults to jsonl for stdin and for files ending with .jsonl",
+        )
+        parser.add_argument("--parent", type=int, help="Add root records to this page")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *, model, file, format, parent, batch_size, **options):
+        try:
+            model = apps.get_model(model)
+        except (LookupError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        if parent is not None:
+            try:
+                parent = model._default_manager.get(pk=parent)
+            except model.DoesNotExist as exc:
+                raise CommandError(f"Parent page {parent} does not exist.") from exc
+        if format is None:
+            format = "jsonl" if file == "-" or file.endswith(".jsonl") else "json"
+
+        with (
+            nullcontext(sys.stdin) if file == "-" else open(file, encoding="utf-8")
+        ) as stream:
+            try:
+                records = (
+                    (json.loads(line) for line in stream if line.strip())
+                    if format == "jsonl"
+                    else json.load(stream)
+                )
+                count = import_pages(
+                    model, records, parent=parent, batch_size=batch_size
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc)) from exc
+
+        self.stdout.write(f"Imported {count} pages.")
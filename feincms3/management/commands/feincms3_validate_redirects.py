@@ -0,0 +1,24 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Validate all redirects of a page model for chains and cycles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="The page model, e.g. pages.Page")
+
+    def handle(self, *, model, **options):
+        try:
+            model = apps.get_model(model)
+        except (LookupError, ValueError) as exc:
+            raise CommandError(str(exc)) from exc
+        if not hasattr(model, "redirect_problems"):
+            raise CommandError(f"{model._meta.label} doesn't use the RedirectMixin.")
+
+        problems = model.redirect_problems()
+        for problem in problems:
+            self.stdout.write(f"{problem.code}: {' -> '.join(map(str, problem.paths))}")
+        if problems:
+            raise CommandError(f"Found {len(problems)} redirect problems.")
+        self.stdout.write("No redirect problems found.")
@@ -1,3 +1,5 @@
+from collections import namedtuple
+
 from django.conf import settings
 from django.core.checks import Warning
 from django.db import models
@@ -209,6 +211,14 @@ class LanguageAndTranslationOfMixin(LanguageMixin):
             )
 
 
+#: A problem found by :meth:`RedirectMixin.redirect_problems`. ``code`` is
+#: ``"both"`` (both redirect fields are set), ``"chain"`` (the page redirects
+#: to a page which redirects itself) or ``"cycle"`` (the pages redirect to each
+#: other in a loop). ``pks`` and ``paths`` list the pages involved in the
+#: order of the redirects.
+RedirectProblem = namedtuple("RedirectProblem", "code pks paths")
+
+
 class RedirectMixin(models.Model):
     """
     The ``RedirectMixin`` allows adding redirects in the page tree.
@@ -238,6 +248,16 @@ class RedirectMixin(models.Model):
         elif self.redirect_to_page:
             return self.redirect_to_page.get_absolute_url()
 
+    async def aget_redirect_url(self):
+        """
+        Async version of :meth:`get_redirect_url`
+        """
+        if self.redirect_to_url:
+            return self.redirect_to_url
+        elif self.redirect_to_page_id:
+            page = await self.__class__._base_manager.aget(pk=self.redirect_to_page_id)
+            return page.get_absolute_url()
+
     def clean_fields(self, exclude=None):
         """
         Ensure that redirects are configured properly.
@@ -294,6 +314,54 @@ class RedirectMixin(models.Model):
                     exclude=exclude,
                 )
 
+    @classmethod
+    def redirect_problems(cls, queryset=None):
+        """
+        Return a list of :data:`RedirectProblem` tuples for all pages in
+        ``queryset`` (defaults to all pages)
+
+        Other than :meth:`clean_fields` which validates one page at a time,
+        this fetches the redirect fields of all pages using a single query and
+        checks the whole redirect graph in memory in linear time, which is
+        useful e.g. after importing many redirects.
+        """
+        if queryset is None:
+            queryset = cls._base_manager.all()
+        rows = queryset.order_by().values_list(
+            "pk", "path", "redirect_to_url", "redirect_to_page"
+        )
+        paths, urls, targets = {}, {}, {}
+        for pk, path, url, target in rows.iterator():
+            paths[pk], urls[pk], targets[pk] = path, url, target
+
+        def problem(code, pks):
+            return RedirectProblem(code, pks, [paths.get(pk) for pk in pks])
+
+        problems = [problem("both", [pk]) for pk in targets if urls[pk] and targets[pk]]
+
+        # Every page redirects to at most one other page, so following the
+        # redirects from each page visits every page at most once overall.
+        state = {}
+        for start in targets:
+            walk = []
+            pk = start
+            while pk in targets and pk not in state:
+                state[pk] = start
+                walk.append(pk)
+                pk = targets[pk]
+            if pk in state and state[pk] == start:
+                problems.append(problem("cycle", walk[walk.index(pk) :]))
+
+        cycles = {pk for p in problems if p.code == "cycle" for pk in p.pks}
+        problems.extend(
+            problem("chain", [pk, target])
+            for pk, target in targets.items()
+            if target is not None
+            and pk not in cycles
+            and (urls.get(target) or targets.get(target) is not None)
+        )
+        return problems
+
     @classmethod
     def admin_fieldset(cls, **kwargs):
         cfg = {
@@ -1,15 +1,37 @@
+import weakref
 from collections import OrderedDict
+from functools import lru_cache
 
-from django.core.checks import Warning
+from content_editor.models import PluginBase
+from django.core.checks import Error, Warning
+from django.core.signals import setting_changed
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models import Q
-from django.urls import NoReverseMatch, get_script_prefix, reverse
+from django.db import models, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal
+from django.urls import (
+    NoReverseMatch,
+    get_resolver,
+    get_script_prefix,
+    get_urlconf,
+    reverse,
+)
 from django.utils.encoding import iri_to_uri
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import get_language, gettext_lazy as _
 from tree_queries.models import OrderableTreeNode, TreeQuerySet
 
-from feincms3.utils import validation_error
+from feincms3 import invalidation
+from feincms3.utils import chunked, validation_error
+
+
+#: Sent once after ``AbstractPage.save`` has updated descendants in bulk,
+#: since no ``post_save`` signals are sent for them in this case. Receives the
+#: page class as ``sender``, the saved page as ``instance`` and the primary
+#: keys of updated descendants as ``pks`` (``None`` if the descendants have
+#: been updated in the database directly and the keys are unknown).
+subtree_changed = Signal()
 
 
 def path_with_script_prefix(path):
@@ -20,6 +42,57 @@ def path_with_script_prefix(path):
     return iri_to_uri(get_script_prefix().rstrip("/") + path)
 
 
+def _page_url(path, *, fast=False):
+    if fast:
+        urlconf = get_urlconf()
+        resolver = get_resolver(urlconf)
+        if (has_pages := _has_pages_namespace.get(resolver)) is None:
+            has_pages = _has_pages_namespace[resolver] = (
+                "pages" in resolver.namespace_dict
+            )
+        if not has_pages:
+            return path_with_script_prefix(path)
+        return _reverse_page_url(urlconf, get_script_prefix(), get_language(), path)
+
+    try:
+        if path == "/":
+            return reverse("pages:root")
+        return reverse("pages:page", kwargs={"path": path.strip("/")})
+    except NoReverseMatch:
+        return path_with_script_prefix(path)
+
+
+# Whether URL resolvers contain the "pages" namespace. Resolvers are cached by
+# Django, and are garbage collected when e.g. apps URLconf modules go away.
+_has_pages_namespace = weakref.WeakKeyDictionary()
+
+
+# The script prefix and the active language are a part of the key because
+# they influence the result of reverse().
+@lru_cache(maxsize=4096)
+def _reverse_page_url(urlconf, script_prefix, language, path):
+    return _page_url(path)
+
+
+def _clear_page_url_caches(*, setting, **kwargs):
+    # The key of ROOT_URLCONF is always None; see django/test/signals.py
+    if setting in {"ROOT_URLCONF", "FORCE_SCRIPT_NAME"}:
+        _reverse_page_url.cache_clear()
+
+
+setting_changed.connect(_clear_page_url_caches)
+
+
+def _filter_path_prefix(queryset, prefix, *, name="path_prefix"):
+    # path__startswith uses LIKE which is case-insensitive on SQLite, so the
+    # prefix is compared exactly as well.
+    return (
+        queryset.filter(path__startswith=prefix)
+        .alias(**{name: Substr("path", 1, len(prefix))})
+        .filter(**{name: prefix})
+    )
+
+
 class AbstractPageQuerySet(TreeQuerySet):
     """
     Defines a single method, ``active``, which only returns pages with
@@ -35,6 +108,15 @@ class AbstractPageQuerySet(TreeQuerySet):
         """
         return self.filter(is_active=True)
 
+    def _applications(self):
+        fields = ("path", "page_type", "app_namespace", "language_code")
+        return (
+            self.without_tree_fields()
+            .exclude(app_namespace="")
+            .values_list(*fields)
+            .order_by(*fields)
+        )
+
     def applications(self):
         """
         Helper for transforming a queryset into the apps format
@@ -42,14 +124,283 @@ class AbstractPageQuerySet(TreeQuerySet):
         filtered (on purpose) so you have to apply the ``.active()`` filtering
         yourself.
         """
-        fields = ("path", "page_type", "app_namespace", "language_code")
-        return list(
-            self.without_tree_fields()
-            .exclude(app_namespace="")
-            .values_list(*fields)
-            .order_by(*fields)
+        return list(self._applications())
+
+    async def aapplications(self):
+        """
+        Async version of :meth:`applications`
+        """
+        return [row async for row in self._applications()]
+
+    def ancestors_by_path(self, of, *, include_self=False):
+        """
+        Return pages whose path is a prefix of the path of ``of``, ordered
+        from the root down
+
+        This uses the unique index on ``path`` instead of the recursive CTE of
+        ``ancestors()``. The result is only equal to ``ancestors()`` as long as
+        no static paths are involved: Static pages may have a path which
+        doesn't start with their parent's path, and unrelated static pages may
+        have a path which is a prefix of the path of ``of``.
+        :meth:`AbstractPage.breadcrumbs` checks the result and falls back to
+        ``ancestors()`` if necessary.
+        """
+        path = of.path
+        prefixes = [path[: index + 1] for index, c in enumerate(path) if c == "/"]
+        if not include_self:
+            prefixes = prefixes[:-1]
+        return self.without_tree_fields().filter(path__in=prefixes).order_by("path")
+
+    def descendants_by_path(self, of, *, include_self=False):
+        """
+        Return pages whose path starts with the path of ``of``, ordered by
+        path
+
+        This uses the unique index on ``path`` instead of the recursive CTE of
+        ``descendants()``. The same caveats as for :meth:`ancestors_by_path`
+        apply: Descendants with a static path not starting with the path of
+        ``of`` are missing, unrelated static pages whose path starts with the
+        path of ``of`` are included. Paths are compared case-sensitively on
+        all databases.
+        """
+        queryset = _filter_path_prefix(self.without_tree_fields(), of.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=of.pk)
+        return queryset.order_by("path")
+
+
+class PageTreeNode:
+    """
+    A page in a :class:`PageTreeSnapshot`
+
+    Nodes only reference their snapshot and their position in it. The
+    attributes are looked up in the columns of the snapshot when accessed.
+    """
+
+    __slots__ = ("index", "snapshot")
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+
+    def __repr__(self):
+        return f"<PageTreeNode pk={self.pk!r} path={self.path!r}>"
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PageTreeNode)
+            and self.snapshot is other.snapshot
+            and self.index == other.index
         )
 
+    def __hash__(self):
+        return hash((id(self.snapshot), self.index))
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def pk(self):
+        return self.snapshot.pks[self.index]
+
+    id = pk
+
+    @property
+    def parent_id(self):
+        parent = self.snapshot.parents[self.index]
+        return None if parent < 0 else self.snapshot.pks[parent]
+
+    @property
+    def parent(self):
+        parent = self.snapshot.parents[self.index]
+        return None if parent < 0 else PageTreeNode(self.snapshot, parent)
+
+    @property
+    def title(self):
+        return self.snapshot.titles[self.index]
+
+    @property
+    def path(self):
+        return self.snapshot.paths[self.index]
+
+    @property
+    def position(self):
+        return self.snapshot.positions[self.index]
+
+    @property
+    def menu(self):
+        return self.snapshot.menus[self.index]
+
+    @property
+    def language_code(self):
+        return self.snapshot.language_codes[self.index]
+
+    @property
+    def tree_depth(self):
+        return self.snapshot.depths[self.index]
+
+    @property
+    def tree_path(self):
+        """
+        Primary keys of all ancestors and of the node itself, starting at the
+        root like django-tree-queries' ``tree_path``
+        """
+        return [node.pk for node in self.ancestors(include_self=True)]
+
+    @property
+    def children(self):
+        return [
+            PageTreeNode(self.snapshot, index)
+            for index in self.snapshot.children[self.index]
+        ]
+
+    def ancestors(self, *, include_self=False):
+        """
+        Return the ancestors of this node, starting at the root
+        """
+        parents = self.snapshot.parents
+        indexes = [self.index] if include_self else []
+        index = parents[self.index]
+        while index >= 0:
+            indexes.append(index)
+            index = parents[index]
+        return [PageTreeNode(self.snapshot, index) for index in reversed(indexes)]
+
+    def descendants(self, *, include_self=False):
+        """
+        Return the descendants of this node in tree order
+        """
+        # Descendants directly follow their ancestor in the snapshot.
+        depths = self.snapshot.depths
+        depth = depths[self.index]
+        index = self.index + 1
+        while index < len(depths) and depths[index] > depth:
+            index += 1
+        return [
+            PageTreeNode(self.snapshot, i)
+            for i in range(self.index if include_self else self.index + 1, index)
+        ]
+
+    def get_absolute_url(self):
+        """
+        Return the page's absolute URL the same way
+        :meth:`AbstractPage.get_absolute_url` does
+        """
+        return _page_url(self.path, fast=self.snapshot.model.FAST_ABSOLUTE_URL)
+
+
+class PageTreeSnapshot:
+    """
+    Compact snapshot of the active page tree
+
+    The snapshot stores the primary key, title, path, position, menu (if the
+    page class has a ``menu`` field), language code (if the page class has a
+    ``language_code`` field), depth and parent of pages in lists (columns)
+    instead of model instances. Pages are stored in tree order. Use
+    :meth:`AbstractPage.tree_snapshot` instead of instantiating snapshots
+    yourself.
+    """
+
+    def __init__(self, queryset, *, version=None):
+        self.version = version
+        self.model = model = queryset.model
+        field_names = {field.name for field in model._meta.get_fields()}
+        has_menu = "menu" in field_names
+        has_language_code = "language_code" in field_names
+
+        fields = ["pk", "parent_id", "title", "path", "position"]
+        fields.extend(["menu"] if has_menu else [])
+        fields.extend(["language_code"] if has_language_code else [])
+
+        self.pks = []
+        self.parents = []
+        self.titles = []
+        self.paths = []
+        self.positions = []
+        self.menus = []
+        self.language_codes = []
+        self.depths = []
+        self.children = []
+        self._roots = []
+        self._index = {}
+        self._index_by_path = {}
+
+        for row in queryset.values_list(*fields):
+            pk, parent_id, title, path, position = row[:5]
+            if parent_id is None:
+                parent = -1
+                self._roots.append(len(self.pks))
+            elif (parent := self._index.get(parent_id)) is None:
+                # The parent isn't a part of the snapshot, for example because
+                # it uses another language. Skip the page and its descendants.
+                continue
+            else:
+                self.children[parent].append(len(self.pks))
+
+            self._index[pk] = self._index_by_path[path] = len(self.pks)
+            self.pks.append(pk)
+            self.parents.append(parent)
+            self.titles.append(title)
+            self.paths.append(path)
+            self.positions.append(position)
+            self.menus.append(row[5] if has_menu else "")
+            self.language_codes.append(row[-1] if has_language_code else "")
+            self.depths.append(0 if parent < 0 else self.depths[parent] + 1)
+            self.children.append([])
+
+    def __len__(self):
+        return len(self.pks)
+
+    def __iter__(self):
+        return (PageTreeNode(self, index) for index in range(len(self.pks)))
+
+    def __contains__(self, pk):
+        return pk in self._index
+
+    def get(self, pk, default=None):
+        """
+        Return the node for the page with the primary key ``pk``
+        """
+        index = self._index.get(pk)
+        return default if index is None else PageTreeNode(self, index)
+
+    def get_by_path(self, path, default=None):
+        """
+        Return the node for the page with the path ``path``
+        """
+        index = self._index_by_path.get(path)
+        return default if index is None else PageTreeNode(self, index)
+
+    def roots(self):
+        """
+        Return the root nodes
+        """
+        return [PageTreeNode(self, index) for index in self._roots]
+
+    def menu(self, menu, *, max_depth=None):
+        """
+        Return the nodes in the menu ``menu`` in tree order, optionally only
+        up to a depth of ``max_depth``
+        """
+        return [
+            PageTreeNode(self, index)
+            for index, value in enumerate(self.menus)
+            if value == menu and (max_depth is None or self.depths[index] <= max_depth)
+        ]
+
+
+# Snapshots are shared by all threads of a process and are rebuilt when the
+# version stamp stored in the cache changes.
+_tree_snapshots = {}
+
+
+def _tree_version_key(model):
+    return f"page-tree-{model._meta.concrete_model._meta.label_lower}"
+
+
+def _content_version_key(model):
+    return f"page-content-{model._meta.concrete_model._meta.label_lower}"
+
 
 class AbstractPage(OrderableTreeNode):
     """
@@ -105,6 +456,26 @@ class AbstractPage(OrderableTreeNode):
 
     objects = AbstractPageQuerySet.as_manager(with_tree_fields=True)
 
+    #: How ``save()`` updates descendants when ``path`` or ``is_active``
+    #: change. ``"save"`` calls ``save()`` on each descendant. ``"bulk"``
+    #: computes the new values in memory, only writes rows which actually
+    #: changed using ``bulk_update`` and sends
+    #: :data:`~feincms3.pages.subtree_changed` once instead of sending
+    #: ``pre_save`` and ``post_save`` for each descendant. ``"sql"`` rewrites
+    #: the paths of descendants using a single ``UPDATE`` statement which
+    #: replaces the old path prefix with the new one and, if the page has been
+    #: deactivated, deactivates all descendants using another statement.
+    #: ``"bulk"`` and ``"sql"`` are much faster for large subtrees but skip any
+    #: custom ``save()`` logic of descendants.
+    DESCENDANT_UPDATES = "save"
+
+    #: Set this to ``True`` to make ``get_absolute_url`` check only once per
+    #: URLconf whether the ``pages`` namespace exists instead of catching a
+    #: ``NoReverseMatch`` exception each time when it doesn't, e.g. when
+    #: using the root middleware. If it exists, reversed URLs are memoized
+    #: in a bounded cache.
+    FAST_ABSOLUTE_URL = False
+
     class Meta(OrderableTreeNode.Meta):
         abstract = True
         verbose_name = _("page")
@@ -135,6 +506,54 @@ class AbstractPage(OrderableTreeNode):
             nodes[node.id] = node
         return nodes
 
+    def _branch_values(self):
+        # Like _branch_for_update, but without instantiating descendants.
+        # Maps primary keys to (path, is_active, changed) tuples in tree order,
+        # starting with the page itself.
+        branch = {self.pk: (self.path, self.is_active, True)}
+        for (
+            pk,
+            parent_id,
+            slug,
+            static_path,
+            path,
+            is_active,
+        ) in self.descendants().values_list(
+            "pk", "parent_id", "slug", "static_path", "path", "is_active"
+        ):
+            parent_path, parent_is_active, _changed = branch[parent_id]
+            new_path = path if static_path else f"{parent_path}{slug}/"
+            # Descendants of inactive nodes cannot be active themselves:
+            new_is_active = is_active and parent_is_active
+            branch[pk] = (
+                new_path,
+                new_is_active,
+                (new_path, new_is_active) != (path, is_active),
+            )
+        return branch
+
+    def breadcrumbs(self, *, include_self=True):
+        """
+        Return a list of the page's ancestors starting at the root, and of
+        the page itself if ``include_self`` is ``True``
+
+        Uses :meth:`~AbstractPageQuerySet.ancestors_by_path` and verifies that
+        the fetched pages actually form the chain of parents of this page.
+        Falls back to the recursive CTE of ``ancestors()`` if they don't,
+        e.g. because static paths are involved.
+        """
+        queryset = self.__class__._default_manager
+        pages = {page.pk: page for page in queryset.ancestors_by_path(self)}
+        ancestors = []
+        parent_id = self.parent_id
+        while parent_id is not None:
+            if (parent := pages.get(parent_id)) is None:
+                ancestors = list(queryset.ancestors(self))
+                break
+            ancestors.insert(0, parent)
+            parent_id = parent.parent_id
+        return [*ancestors, self] if include_self else ancestors
+
     def _set_parent(self, parent):
         # Hook used in feincms3-sites and feincms3-language-sites
         self.parent = parent
@@ -143,11 +562,6 @@ class AbstractPage(OrderableTreeNode):
         # Hook used in feincms3-sites and feincms3-language-sites
         return self.__class__._default_manager
 
-    def _path_clash_candidates(self):
-        return self._clash_candidates().exclude(
-            Q(pk__in=self.descendants(), static_path=False) | Q(pk=self.pk)
-        )
-
     def clean_fields(self, exclude=None):
         """
         Check for path uniqueness problems.
@@ -172,15 +586,39 @@ class AbstractPage(OrderableTreeNode):
         if not self.pk:
             return
 
-        clash_candidates = dict(self._path_clash_candidates().values_list("path", "id"))
-        for node in self._branch_for_update().values():
-            if (
-                node.path in clash_candidates
-                and not clash_candidates[node.path] == node.pk
+        # Nodes of the branch may clash with each other, e.g. when a static
+        # path equals the new path of a sibling.
+        branch = self._branch_values()
+        nodes = {}
+        for pk, (path, _is_active, _changed) in branch.items():
+            nodes.setdefault(path, []).append(pk)
+        clashes = {path for path, pks in nodes.items() if len(pks) > 1}
+
+        # Only ask the database about the new paths of the branch. Pages
+        # outside the branch using one of those paths are a problem; pages in
+        # the branch either keep their path or free it up.
+        holders = {}
+        for paths in chunked(nodes, 500):
+            for path, pk in (
+                self._clash_candidates()
+                .without_tree_fields()
+                .filter(path__in=paths)
+                .values_list("path", "pk")
             ):
+                if pk not in branch:
+                    clashes.add(path)
+                elif branch[pk][0] == path:
+                    holders[path] = pk
+
+        for pk, (path, _is_active, _changed) in branch.items():
+            if path in clashes and pk != holders.get(path):
+                # Only load the offending page for the error message.
+                node = (
+                    self if pk == self.pk else self.__class__._base_manager.get(pk=pk)
+                )
                 raise validation_error(
                     _("The page %(page)s's new path %(path)s would not be unique.")
-                    % {"page": node, "path": node.path},
+                    % {"page": node, "path": path},
                     field="path",
                     exclude=exclude,
                 )
@@ -209,13 +647,75 @@ class AbstractPage(OrderableTreeNode):
             save_descendants is None
             and (self.is_active, self.path) != self._save_descendants_cache
         ):
-            for pk, node in self._branch_for_update().items():
-                if pk == self.pk:
-                    continue
-                node.save(save_descendants=False)
+            if (
+                self.DESCENDANT_UPDATES == "sql"
+                and save_descendants is None
+                and self._save_descendants_cache[1]
+            ):
+                self._sql_update_descendants(self._save_descendants_cache[1])
+            elif self.DESCENDANT_UPDATES in {"bulk", "sql"}:
+                # Forced updates recompute all values, in bulk.
+                self._bulk_update_descendants()
+            else:
+                for pk, node in self._branch_for_update().items():
+                    if pk == self.pk:
+                        continue
+                    node.save(save_descendants=False)
+
+        self._save_descendants_cache = (self.is_active, self.path)
 
     save.alters_data = True
 
+    def _bulk_update_descendants(self):
+        # bulk_update only needs the primary key and the updated fields.
+        nodes = [
+            self.__class__(pk=pk, path=path, is_active=is_active)
+            for pk, (path, is_active, changed) in self._branch_values().items()
+            if pk != self.pk and changed
+        ]
+        self.__class__._base_manager.bulk_update(
+            nodes, ["is_active", "path"], batch_size=500
+        )
+        subtree_changed.send(
+            sender=self.__class__, instance=self, pks=[node.pk for node in nodes]
+        )
+
+    def _sql_update_descendants(self, old_path):
+        queryset = self.__class__._base_manager
+
+        if self.path != old_path:
+            # The path of non-static pages always starts with the path of
+            # their parent. Therefore, non-static pages whose path starts with
+            # the old path are descendants of this page, except when they are
+            # descendants of static pages whose path starts with the old path
+            # as well.
+            descendants = _filter_path_prefix(queryset.all(), old_path)
+            exclude = Q(pk=self.pk)
+            for index, path in enumerate(
+                descendants.filter(static_path=True)
+                .exclude(pk=self.pk)
+                .values_list("path", flat=True)
+            ):
+                descendants = descendants.alias(
+                    **{f"static_prefix_{index}": Substr("path", 1, len(path))}
+                )
+                exclude |= Q(**{f"static_prefix_{index}": path})
+
+            descendants.filter(static_path=False).exclude(exclude).update(
+                path=Concat(
+                    Value(self.path),
+                    Substr("path", len(old_path) + 1),
+                    output_field=models.CharField(),
+                )
+            )
+
+        if not self.is_active:
+            queryset.filter(
+                pk__in=self.descendants().values("pk"), is_active=True
+            ).update(is_active=False)
+
+        subtree_changed.send(sender=self.__class__, instance=self, pks=None)
+
     def get_absolute_url(self):
         """
         Return the page's absolute URL
@@ -230,17 +730,74 @@ class AbstractPage(OrderableTreeNode):
         ``self.path`` prefixed with the script prefix which is ``/`` in the
         standard case.
         """
-        try:
-            if self.path == "/":
-                return reverse("pages:root")
-            return reverse("pages:page", kwargs={"path": self.path.strip("/")})
-        except NoReverseMatch:
-            return path_with_script_prefix(self.path)
+        return _page_url(self.path, fast=self.FAST_ABSOLUTE_URL)
+
+    @classmethod
+    def tree_snapshot(cls, language_code=None):
+        """
+        Return a :class:`PageTreeSnapshot` of all active pages, optionally
+        only of those using the language ``language_code``
+
+        Snapshots are kept in memory and reused until the version stamp
+        returned by :meth:`tree_version` changes. Building menus, breadcrumbs
+        etc. from the snapshot doesn't need any database queries.
+        """
+        version = cls.tree_version()
+        key = (_tree_version_key(cls), language_code)
+        snapshot = _tree_snapshots.get(key)
+        if snapshot is None or version is None or snapshot.version != version:
+            queryset = cls._default_manager.active().with_tree_fields()
+            if language_code is not None:
+                queryset = queryset.filter(language_code=language_code)
+            snapshot = PageTreeSnapshot(queryset, version=version)
+            if version is not None:
+                _tree_snapshots[key] = snapshot
+        return snapshot
+
+    @classmethod
+    def tree_version(cls):
+        """
+        Return the version stamp of the page tree
+
+        The stamp is managed by :mod:`feincms3.invalidation` so that all
+        processes notice changes.
+        """
+        return invalidation.version(_tree_version_key(cls))
+
+    @classmethod
+    def bump_tree_version(cls):
+        """
+        Change the version stamp of the page tree
+
+        This happens automatically when pages are saved or deleted and when
+        :data:`~feincms3.pages.subtree_changed` is sent. Code updating pages
+        in other ways, e.g. using ``queryset.update()``, has to call this
+        method itself.
+        """
+        invalidation.bump(_tree_version_key(cls))
+
+    @classmethod
+    def content_version(cls):
+        """
+        Return the version stamp of the content of pages
+
+        The stamp changes when plugins of pages (content-editor plugins with a
+        ``parent`` foreign key to the page model) are saved or deleted.
+        """
+        return invalidation.version(_content_version_key(cls))
+
+    @classmethod
+    def bump_content_version(cls):
+        """
+        Change the version stamp of the content of pages
+        """
+        invalidation.bump(_content_version_key(cls))
 
     @classmethod
     def check(cls, **kwargs):
         errors = super().check(**kwargs)
         errors.extend(cls._check_feincms3_pages_default_ordering(**kwargs))
+        errors.extend(cls._check_feincms3_pages_descendant_updates(**kwargs))
         return errors
 
     @classmethod
@@ -257,3 +814,43 @@ class AbstractPage(OrderableTreeNode):
                 ),
             ]
         return []
+
+    @classmethod
+    def _check_feincms3_pages_descendant_updates(cls, **kwargs):
+        if cls.DESCENDANT_UPDATES not in {"save", "bulk", "sql"}:
+            return [
+                Error(
+                    f"Invalid DESCENDANT_UPDATES value {cls.DESCENDANT_UPDATES!r}.",
+                    hint='Use one of "save", "bulk" or "sql".',
+                    obj=cls,
+                    id="feincms3.E007",
+                ),
+            ]
+        return []
+
+
+def _bump_tree_version(sender, using=None, **kwargs):
+    if issubclass(sender, AbstractPage):
+        sender.bump_tree_version()
+        if transaction.get_connection(using).in_atomic_block:
+            # Other processes could rebuild their snapshot before the
+            # transaction is committed; bump the version again afterwards.
+            transaction.on_commit(sender.bump_tree_version, using=using)
+
+
+def _bump_content_version(sender, using=None, **kwargs):
+    if (
+        issubclass(sender, PluginBase)
+        and (model := sender._meta.get_field("parent").related_model)
+        and issubclass(model, AbstractPage)
+    ):
+        model.bump_content_version()
+        if transaction.get_connection(using).in_atomic_block:
+            transaction.on_commit(model.bump_content_version, using=using)
+
+
+post_save.connect(_bump_tree_version)
+post_delete.connect(_bump_tree_version)
+post_save.connect(_bump_content_version)
+post_delete.connect(_bump_content_version)
+subtree_changed.connect(_bump_tree_version)
@@ -42,6 +42,57 @@ Example code for using this module (e.g. ``app.pages.middleware``):
         handler=handler,
     )
 
+The middleware supports both sync and async requests. When running under ASGI,
+pages are fetched using the async ORM, and handlers may be ``async def``
+functions (``add_redirect_handler`` supports those as well) so that requests
+for pages do not have to switch to a thread. Template responses returned by
+handlers are rendered by the middleware (in a thread when running under ASGI):
+
+.. code-block:: python
+
+    @add_redirect_handler
+    async def handler(request, page):
+        context = await sync_to_async(page_context)(request, page=page)
+        return TemplateResponse(request, page.type.template_name, context)
+
+Redirect map
+------------
+
+Sites with many redirect pages (see :class:`~feincms3.mixins.RedirectMixin`)
+may want to answer redirects before URL resolution and without fetching the
+redirecting page and its target from the database first. The middleware
+returned by :func:`create_redirect_map_middleware` keeps a map of source paths
+to redirect targets of all redirect pages in memory. It should be added early
+in the ``MIDDLEWARE`` list, but after ``LocaleMiddleware`` if URLs of pages
+depend on the active language:
+
+.. code-block:: python
+
+    redirect_map_middleware = create_redirect_map_middleware(
+        queryset=Page.objects.active(),
+    )
+
+Caching responses
+-----------------
+
+Responses of page handlers for anonymous users can be cached using
+:func:`cache_page_response`. The cache is invalidated automatically when pages
+or their plugins are saved or deleted:
+
+.. code-block:: python
+
+    @add_redirect_handler
+    @cache_page_response(timeout=300, vary=["Accept-Language"])
+    def handler(request, page):
+        return render(request, page.type.template_name, page_context(request, page=page))
+
+Conditional requests
+--------------------
+
+:func:`conditional_page_response` adds ``ETag`` headers to responses of page
+handlers and answers conditional ``GET`` requests with ``304 Not Modified``
+without running the handler at all if the page hasn't changed.
+
 Building a preview functionality
 --------------------------------
 
@@ -83,14 +134,29 @@ itself instead of a template file.
     )
 """
 
-from functools import wraps
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from functools import cache, wraps
 
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
 from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
 from django.http import (
     HttpResponseNotFound,
     HttpResponsePermanentRedirect,
     HttpResponseRedirect,
 )
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.translation import get_language
+
+from feincms3.pages import _page_url
+from feincms3.shortcuts import _not_modified, _validators, _with_validators
 
 
 class UseRootMiddlewareResponse(HttpResponseNotFound):
@@ -120,7 +186,82 @@ class UseRootMiddlewareResponse(HttpResponseNotFound):
     """
 
 
-def create_page_if_404_middleware(*, queryset, handler, language_code_redirect=False):
+class _VersionedCache:
+    """
+    Bounded in-process LRU cache, optionally backed by a shared Django cache
+
+    Entries are only valid for the version stamp they were stored with. Nothing
+    is cached without a version stamp, e.g. when using Django's ``DummyCache``.
+    """
+
+    def __init__(self, name, *, size, shared_cache=None):
+        self.name = name
+        self.size = size
+        self.shared_cache = shared_cache
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _shared_key(self, key, version):
+        return f"feincms3-root-{self.name}-{version}-{key}"
+
+    def get(self, key, version):
+        if version is None:
+            return None
+        with self.lock:
+            if (entry := self.entries.get(key)) is not None:
+                if entry[0] == version:
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                del self.entries[key]
+        if self.shared_cache and (
+            value := caches[self.shared_cache].get(self._shared_key(key, version))
+        ):
+            self._set_local(key, version, value)
+            return value
+        return None
+
+    def set(self, key, version, value):
+        if version is None:
+            return
+        self._set_local(key, version, value)
+        if self.shared_cache:
+            caches[self.shared_cache].set(self._shared_key(key, version), value)
+
+    def _set_local(self, key, version, value):
+        with self.lock:
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def _query_key(qs):
+    # Querysets returned by callables may differ between requests (e.g. when
+    # staff users are allowed to preview inactive pages), so the SQL of the
+    # queryset is a part of cache keys. Compiling tree queries adds the CTE
+    # join to the query, so a clone is compiled.
+    try:
+        return qs.query.clone().sql_with_params()
+    except EmptyResultSet:
+        return None
+
+
+def _cache_key(query_key, *paths):
+    return hashlib.md5(
+        repr((query_key, paths)).encode(), usedforsecurity=False
+    ).hexdigest()
+
+
+def create_page_if_404_middleware(
+    *,
+    queryset,
+    handler,
+    language_code_redirect=False,
+    miss_cache_size=0,
+    page_cache_size=0,
+    shared_cache=None,
+    page_first=False,
+):
     """
     Create a middleware for handling pages
 
@@ -143,41 +284,284 @@ def create_page_if_404_middleware(*, queryset, handler, language_code_redirect=F
       code prefix (e.g. ``/en/``, ``/de-ch/``) if request path equals the
       script prefix (generally ``/``), no active page for ``/`` exists and the
       prefixed version exists.
+    - ``miss_cache_size`` (``0``): Remember up to this many paths which didn't
+      match any page, so that e.g. bots requesting ``/wp-login.php`` over and
+      over do not cause database queries. The cache is invalidated when the
+      version stamp of the page tree changes, see
+      :meth:`~feincms3.pages.AbstractPage.tree_version`.
+    - ``page_cache_size`` (``0``): Remember up to this many pages by path, so
+      that the page doesn't have to be fetched from the database again (which
+      is often a recursive CTE query). Handlers receive a fresh copy of the
+      cached page instance each time. Like the miss cache, this cache is
+      invalidated when the version stamp of the page tree changes. The stamp
+      only changes when pages are saved or deleted, so don't prefetch related
+      objects such as plugins in the queryset.
+    - ``shared_cache`` (``None``): The alias of a Django cache which is used in
+      addition to the in-process caches, e.g. to share the caches between
+      processes.
+    - ``page_first`` (``False``): Check whether the path of the request is the
+      path of a page *before* calling the rest of the middleware chain and the
+      view, and call the handler directly if it is. The paths of all pages in
+      the queryset except for app pages (which still have to go through
+      Django's URL resolver) are kept in memory until the version stamp of the
+      page tree changes. Note that this changes the priority: pages win over
+      views of the ``ROOT_URLCONF`` using the same path.
     """
 
+    misses = (
+        _VersionedCache("misses", size=miss_cache_size, shared_cache=shared_cache)
+        if miss_cache_size
+        else None
+    )
+    pages_cache = (
+        _VersionedCache("pages", size=page_cache_size, shared_cache=shared_cache)
+        if page_cache_size
+        else None
+    )
+
+    paths_cache = _VersionedCache("paths", size=16) if page_first else None
+
+    options = {
+        "language_code_redirect": language_code_redirect,
+        "misses": misses,
+        "pages_cache": pages_cache,
+        "paths_cache": paths_cache,
+    }
+
+    def lookup(request):
+        return _lookup(request, queryset, options)
+
+    async def alookup(request):
+        return await _alookup(request, queryset, options)
+
+    @sync_and_async_middleware
     def outer(get_response):
-        def inner(request):
-            response = get_response(request)
-            if response.status_code != 404 or (
-                request.resolver_match
-                and not isinstance(response, UseRootMiddlewareResponse)
-            ):
-                # Response is not a 404 OR the 404 comes from a resolved view
-                # which also didn't return a UseRootMiddlewareResponse.
-                return response
-            qs = queryset(request) if callable(queryset) else queryset._clone()
-            if page := qs.filter(path=request.path_info).first():
-                return handler(request, page)
-            if language_code_redirect and request.path_info == "/":
-                target = f"/{request.LANGUAGE_CODE}/"
-                if qs.filter(path=target).exists():
-                    return HttpResponseRedirect(target)
-            if settings.APPEND_SLASH and not request.path_info.endswith("/"):
-                target = request.path_info + "/"
-                if qs.filter(path=target).exists():
-                    return HttpResponsePermanentRedirect(target)
-            return response
+        if iscoroutinefunction(get_response):
+
+            async def inner(request):
+                current = None
+                if (
+                    page_first
+                    and await (current := await alookup(request)).ais_page_path()
+                ):
+                    page, _response = await current.aresolve(None)
+                    if page is not None:
+                        return await _acall(handler, request, page)
+                response = await get_response(request)
+                if not _falls_through(request, response):
+                    return response
+                current = current or await alookup(request)
+                page, response = await current.aresolve(response)
+                if page is None:
+                    return response
+                return await _acall(handler, request, page)
+
+        else:
+
+            def inner(request):
+                current = None
+                if page_first and (current := lookup(request)).is_page_path():
+                    page, _response = current.resolve(None)
+                    if page is not None:
+                        return _call(handler, request, page)
+                response = get_response(request)
+                if not _falls_through(request, response):
+                    return response
+                page, response = (current or lookup(request)).resolve(response)
+                if page is None:
+                    return response
+                return _call(handler, request, page)
 
         return inner
 
     return outer
 
 
+def _lookup(request, queryset, options):
+    return _PageLookup(
+        request,
+        queryset(request) if callable(queryset) else queryset._clone(),
+        **options,
+    )
+
+
+async def _alookup(request, queryset, options):
+    # Queryset callables may e.g. access request.user which loads the session
+    # from the database, and reading version stamps from the cache blocks as
+    # well.
+    if callable(queryset) or any(
+        options[name] for name in ("misses", "pages_cache", "paths_cache")
+    ):
+        return await sync_to_async(_lookup)(request, queryset, options)
+    return _lookup(request, queryset, options)
+
+
+def _uses_shared_cache(*caches):
+    return any(cache and cache.shared_cache for cache in caches)
+
+
+def _call(handler, request, page):
+    if iscoroutinefunction(handler):
+        response = async_to_sync(handler)(request, page)
+    else:
+        response = handler(request, page)
+    return response.render() if _needs_rendering(response) else response
+
+
+async def _acall(handler, request, page):
+    if iscoroutinefunction(handler):
+        response = await handler(request, page)
+    else:
+        response = await sync_to_async(handler)(request, page)
+    if _needs_rendering(response):
+        # Templates may use the database
+        return await sync_to_async(response.render)()
+    return response
+
+
+def _needs_rendering(response):
+    # Django only renders template responses returned by views, not those
+    # returned by middleware.
+    return callable(getattr(response, "render", None)) and not response.is_rendered
+
+
+def _falls_through(request, response):
+    # Only handle 404 responses which do not come from a resolved view, except
+    # if the view returned a UseRootMiddlewareResponse.
+    return response.status_code == 404 and (
+        not request.resolver_match or isinstance(response, UseRootMiddlewareResponse)
+    )
+
+
+class _PageLookup:
+    """
+    Candidate paths and the state of caches for a request handled by the root
+    middleware
+    """
+
+    def __init__(
+        self,
+        request,
+        queryset,
+        *,
+        language_code_redirect,
+        misses,
+        pages_cache,
+        paths_cache,
+    ):
+        self.qs = queryset
+        self.path = request.path_info
+        self.misses = misses
+        self.pages_cache = pages_cache
+        self.paths_cache = paths_cache
+
+        # Fetch all candidates at once and choose the response afterwards,
+        # in order of priority.
+        self.redirects = []
+        if language_code_redirect and self.path == "/":
+            self.redirects.append((f"/{request.LANGUAGE_CODE}/", HttpResponseRedirect))
+        if settings.APPEND_SLASH and not self.path.endswith("/"):
+            self.redirects.append((f"{self.path}/", HttpResponsePermanentRedirect))
+        self.candidates = [self.path, *(target for target, _ in self.redirects)]
+
+        self.page = None
+        self.known_miss = False
+        self.query_key = (misses or pages_cache or paths_cache) and _query_key(queryset)
+        if self.query_key:
+            self.version = queryset.model.tree_version()
+            self.page_key = _cache_key(self.query_key, self.path)
+            self.miss_key = _cache_key(self.query_key, *self.candidates)
+            if pages_cache and (cached := pages_cache.get(self.page_key, self.version)):
+                self.page = pickle.loads(cached)
+            elif misses and misses.get(self.miss_key, self.version):
+                self.known_miss = True
+
+    def _page_paths(self):
+        queryset = self.qs._clone().without_tree_fields()
+        if "app_namespace" in {f.name for f in queryset.model._meta.get_fields()}:
+            queryset = queryset.filter(app_namespace="")
+        return queryset.order_by().values_list("path", flat=True)
+
+    def is_page_path(self):
+        """
+        Return whether the path of the request is the path of a page which
+        isn't an app page
+
+        Always returns ``False`` without a version stamp; fetching the paths of
+        all pages for each request would be worse than not checking at all.
+        """
+        if not self.query_key or self.version is None:
+            return False
+        key = _cache_key(self.query_key)
+        if (paths := self.paths_cache.get(key, self.version)) is None:
+            paths = frozenset(self._page_paths())
+            self.paths_cache.set(key, self.version, paths)
+        return self.path in paths
+
+    async def ais_page_path(self):
+        """
+        Async version of :meth:`is_page_path`
+        """
+        if not self.query_key or self.version is None:
+            return False
+        key = _cache_key(self.query_key)
+        if (paths := self.paths_cache.get(key, self.version)) is None:
+            paths = frozenset([path async for path in self._page_paths()])
+            self.paths_cache.set(key, self.version, paths)
+        return self.path in paths
+
+    def resolve(self, response):
+        """
+        Return a ``(page, response)`` tuple; either the page which should be
+        passed to the handler or the response
+        """
+        if self.page or self.known_miss:
+            return self.page, response
+        return self._choose(self.qs.filter(path__in=self.candidates), response)
+
+    async def aresolve(self, response):
+        """
+        Async version of :meth:`resolve`
+        """
+        if self.page or self.known_miss:
+            return self.page, response
+        pages = [page async for page in self.qs.filter(path__in=self.candidates)]
+        if _uses_shared_cache(self.misses, self.pages_cache):
+            # Storing entries in the shared cache blocks
+            return await sync_to_async(self._choose)(pages, response)
+        return self._choose(pages, response)
+
+    def _choose(self, pages, response):
+        pages = {page.path: page for page in pages}
+        if page := pages.get(self.path):
+            if self.pages_cache and self.query_key:
+                self.pages_cache.set(self.page_key, self.version, pickle.dumps(page))
+            return page, None
+        for target, redirect in self.redirects:
+            if target in pages:
+                return None, redirect(target)
+        if self.misses and self.query_key:
+            self.misses.set(self.miss_key, self.version, value=True)
+        return None, response
+
+
 def add_redirect_handler(handler):
     """
     Wrap the page handler in a redirect mixin handler
+
+    Async handlers are supported as well.
     """
 
+    if iscoroutinefunction(handler):
+
+        @wraps(handler)
+        async def ainner(request, page):
+            if redirect_to := await page.aget_redirect_url():
+                return HttpResponseRedirect(redirect_to)
+            return await handler(request, page)
+
+        return ainner
+
     @wraps(handler)
     def inner(request, page):
         if redirect_to := page.get_redirect_url():
@@ -185,3 +569,342 @@ def add_redirect_handler(handler):
         return handler(request, page)
 
     return inner
+
+
+def create_redirect_map_middleware(
+    *, queryset, target_fields=("path",), target_url=None
+):
+    """
+    Create a middleware answering requests for paths of redirect pages
+
+    The map of paths to redirect targets is built using a single query for
+    all pages in ``queryset`` (which may also be a callable receiving the
+    request, as in :func:`create_page_if_404_middleware`) and kept in memory
+    until the version stamp of the page tree changes, see
+    :meth:`~feincms3.pages.AbstractPage.tree_version`. Requests therefore do
+    not cause any database queries at all most of the time. Redirects are
+    answered before URL resolution, so redirect pages win over views using the
+    same path.
+
+    Target pages aren't instantiated, so their ``get_absolute_url`` isn't
+    called. By default, URLs of target pages are built the same way as
+    ``AbstractPage.get_absolute_url`` does, using the active language. Pages
+    overriding ``get_absolute_url`` need a ``target_url`` callable receiving
+    the request and a dictionary containing the values of the
+    ``target_fields`` of the target page:
+
+    .. code-block:: python
+
+        create_redirect_map_middleware(
+            queryset=Page.objects.active(),
+            target_fields=["path", "site__host"],
+            target_url=lambda request, target: f"https://{target['site__host']}{target['path']}",
+        )
+
+    If URLs of pages depend on the active language (e.g. when using
+    ``i18n_patterns``), add the middleware after Django's ``LocaleMiddleware``.
+    """
+
+    maps = _VersionedCache("redirects", size=16)
+    options = {"maps": maps, "target_fields": target_fields, "target_url": target_url}
+
+    if callable(queryset):
+
+        def prepare(request):
+            return _redirect_queryset(queryset(request))
+
+    else:
+        # The SQL of the queryset only has to be compiled once
+        prepared = cache(lambda: _redirect_queryset(queryset))
+
+        def prepare(request):
+            return prepared()
+
+    def redirect_map(request):
+        return _RedirectMap(request, *prepare(request), **options)
+
+    @sync_and_async_middleware
+    def outer(get_response):
+        if iscoroutinefunction(get_response):
+
+            async def inner(request):
+                # The queryset callable may e.g. access request.user, and
+                # reading the version stamp from the cache blocks as well.
+                redirects = await sync_to_async(redirect_map)(request)
+                if response := redirects.redirect(request, await redirects.aget()):
+                    return response
+                return await get_response(request)
+
+        else:
+
+            def inner(request):
+                redirects = redirect_map(request)
+                if response := redirects.redirect(request, redirects.get()):
+                    return response
+                return get_response(request)
+
+        return inner
+
+    return outer
+
+
+def _redirect_queryset(queryset):
+    queryset = queryset._clone().without_tree_fields()
+    return queryset, _query_key(queryset)
+
+
+class _RedirectMap:
+    """
+    Map of paths of redirect pages to ``(redirect_to_url, target)`` tuples,
+    where ``target`` contains the values of the target fields of the
+    ``redirect_to_page``
+
+    The map is empty without a version stamp, e.g. when using Django's
+    ``DummyCache``, since it would have to be rebuilt for each request.
+    Redirect pages are still handled by :func:`add_redirect_handler` then.
+    """
+
+    def __init__(
+        self, request, queryset, query_key, *, maps, target_fields, target_url
+    ):
+        self.qs = queryset
+        self.path = request.path_info
+        self.maps = maps
+        self.target_fields = target_fields
+        self.target_url = target_url or self._target_url
+        self.query_key = query_key
+        if self.query_key:
+            self.key = _cache_key(self.query_key, *target_fields)
+            self.version = self.qs.model.tree_version()
+
+    def _rows(self):
+        return (
+            self.qs.filter(Q(redirect_to_page__isnull=False) | ~Q(redirect_to_url=""))
+            .order_by()
+            .values_list(
+                "path",
+                "redirect_to_url",
+                "redirect_to_page",
+                *(f"redirect_to_page__{field}" for field in self.target_fields),
+            )
+        )
+
+    def _set(self, rows):
+        targets = {
+            path: (
+                url,
+                None if target is None else dict(zip(self.target_fields, values)),
+            )
+            for path, url, target, *values in rows
+        }
+        self.maps.set(self.key, self.version, targets)
+        return targets
+
+    def get(self):
+        if not self.query_key or self.version is None:
+            return {}
+        if (targets := self.maps.get(self.key, self.version)) is None:
+            targets = self._set(self._rows())
+        return targets
+
+    async def aget(self):
+        """
+        Async version of :meth:`get`
+        """
+        if not self.query_key or self.version is None:
+            return {}
+        if (targets := self.maps.get(self.key, self.version)) is None:
+            targets = self._set([row async for row in self._rows()])
+        return targets
+
+    def _target_url(self, request, target):
+        return _page_url(target["path"], fast=self.qs.model.FAST_ABSOLUTE_URL)
+
+    def redirect(self, request, targets):
+        """
+        Return a redirect response if the request path is the path of a
+        redirect page
+        """
+        if (redirect := targets.get(self.path)) is None:
+            return None
+        url, target = redirect
+        return HttpResponseRedirect(url or self.target_url(request, target))
+
+
+def cache_page_response(
+    handler=None, *, timeout=DEFAULT_TIMEOUT, vary=(), cache_alias=DEFAULT_CACHE_ALIAS
+):
+    """
+    Cache complete responses of the page handler for anonymous ``GET`` and
+    ``HEAD`` requests
+
+    The cache key contains the primary key of the page, the version stamps of
+    the page tree and of the content of pages (see
+    :meth:`~feincms3.pages.AbstractPage.tree_version` and
+    :meth:`~feincms3.pages.AbstractPage.content_version`), the active language,
+    the absolute URL including the host and the query string and the values of
+    the request headers listed in ``vary``. Saving or deleting pages or their plugins
+    therefore invalidates cached responses automatically. Changes to other
+    data shown on pages do not, which is what ``timeout`` is for. Nothing is
+    cached if the version stamps are unavailable, e.g. when using Django's
+    ``DummyCache`` as the default cache.
+
+    Only successful responses which do not set cookies and aren't marked as
+    private are cached. Responses aren't cached either if the session has been
+    accessed or a new CSRF cookie has to be sent while producing them.
+    Handlers rendering other per-user data shouldn't use this decorator. May be used with or without arguments and
+    supports async handlers as well.
+    """
+    if handler is None:
+        return lambda handler: cache_page_response(
+            handler, timeout=timeout, vary=vary, cache_alias=cache_alias
+        )
+
+    if iscoroutinefunction(handler):
+
+        @wraps(handler)
+        async def ainner(request, page):
+            if key := await sync_to_async(_response_cache_key)(request, page, vary):
+                if response := await caches[cache_alias].aget(key):
+                    return response
+                response = await handler(request, page)
+                # Storing the response in the cache blocks
+                return await sync_to_async(_store_response)(
+                    request, response, key, vary, timeout, cache_alias
+                )
+            return await handler(request, page)
+
+        return ainner
+
+    @wraps(handler)
+    def inner(request, page):
+        if key := _response_cache_key(request, page, vary):
+            if response := caches[cache_alias].get(key):
+                return response
+            response = handler(request, page)
+            return _store_response(request, response, key, vary, timeout, cache_alias)
+        return handler(request, page)
+
+    return inner
+
+
+def _response_cache_key(request, page, vary):
+    if request.method not in {"GET", "HEAD"} or (
+        (user := getattr(request, "user", None)) and user.is_authenticated
+    ):
+        return None
+    model = type(page)
+    versions = (model.tree_version(), model.content_version())
+    if None in versions:
+        # Changes wouldn't be noticed without version stamps
+        return None
+    parts = [
+        page.pk,
+        *versions,
+        get_language(),
+        request.build_absolute_uri(),
+        *(request.headers.get(header, "") for header in vary),
+    ]
+    return f"feincms3-response-{_cache_key(parts)}"
+
+
+def _store_response(request, response, key, vary, timeout, cache_alias):
+    if vary:
+        patch_vary_headers(response, vary)
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or "private" in response.get("Cache-Control", "")
+    ):
+        return response
+
+    def cache_response(response):
+        # Responses depending on the session or containing a new CSRF token
+        # are specific to the visitor. Templates may only access them while
+        # rendering.
+        session = getattr(request, "session", None)
+        if (session is None or not session.accessed) and not request.META.get(
+            "CSRF_COOKIE_NEEDS_UPDATE"
+        ):
+            caches[cache_alias].set(key, response, timeout)
+
+    if callable(getattr(response, "render", None)):
+        # Template responses are cached after rendering
+        response.add_post_render_callback(cache_response)
+    else:
+        cache_response(response)
+    return response
+
+
+def conditional_page_response(handler=None, *, last_modified=None):
+    """
+    Support conditional ``GET`` requests in the page handler
+
+    The ``ETag`` is computed from the values of all fields of the page, the
+    version stamps of the page tree and of the content of pages (see
+    :meth:`~feincms3.pages.AbstractPage.tree_version` and
+    :meth:`~feincms3.pages.AbstractPage.content_version`), the active language
+    and the primary key of the authenticated user, if any. Nothing has to be
+    rendered for this, so the handler isn't called at all if the client (or a
+    CDN) already has the current version of the page. No ``ETag`` is added if
+    the version stamps are unavailable, e.g. when using Django's
+    ``DummyCache``.
+
+    ``last_modified`` is an optional callable receiving the request and the
+    page and returning a datetime, e.g. the value of a timestamp field of the
+    page. May be used with or without arguments and supports async handlers
+    as well.
+    """
+    if handler is None:
+        return lambda handler: conditional_page_response(
+            handler, last_modified=last_modified
+        )
+
+    if iscoroutinefunction(handler):
+
+        @wraps(handler)
+        async def ainner(request, page):
+            validators = await sync_to_async(_page_validators)(
+                request, page, last_modified
+            )
+            if response := _not_modified(request, validators):
+                return response
+            return _page_with_validators(await handler(request, page), validators)
+
+        return ainner
+
+    @wraps(handler)
+    def inner(request, page):
+        validators = _page_validators(request, page, last_modified)
+        if response := _not_modified(request, validators):
+            return response
+        return _page_with_validators(handler(request, page), validators)
+
+    return inner
+
+
+def _page_etag(request, page):
+    model = type(page)
+    versions = (model.tree_version(), model.content_version())
+    if None in versions:
+        # Changes wouldn't be noticed without version stamps
+        return None
+    user = getattr(request, "user", None)
+    return _cache_key(
+        [getattr(page, field.attname) for field in model._meta.concrete_fields],
+        *versions,
+        get_language(),
+        user.pk if user and user.is_authenticated else None,
+    )
+
+
+def _page_validators(request, page, last_modified):
+    return _validators(request, page, _page_etag, last_modified)
+
+
+def _page_with_validators(response, validators):
+    # Validators only describe successful responses, not e.g. redirects
+    if response.status_code == 200:
+        _with_validators(response, validators)
+    return response
@@ -1,5 +1,9 @@
+import datetime as dt
+
 from django.core.paginator import Paginator
 from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 
 __all__ = ("render_detail", "render_list", "template_name")
@@ -29,6 +33,8 @@ def render_list(
     model=None,
     paginate_by=None,
     template_name_suffix="_list",
+    etag=None,
+    last_modified=None,
 ):
     """
     Render a list of items
@@ -50,8 +56,16 @@ def render_list(
     The queryset (or the page if using pagination) are passed into the template
     as ``object_list`` AND ``<model_name>_list``, i.e. ``article_list`` in the
     example above.
+
+    ``etag`` and ``last_modified`` add support for conditional ``GET``
+    requests, see :func:`render_detail`. Callables receive the request and the
+    queryset.
     """
 
+    validators = _validators(request, queryset, etag, last_modified)
+    if response := _not_modified(request, validators):
+        return response
+
     context = context or {}
     if paginate_by:
         object_list = Paginator(queryset, paginate_by).get_page(request.GET.get("page"))
@@ -62,12 +76,21 @@ def render_list(
     context.update(
         {"object_list": object_list, "%s_list" % model._meta.model_name: object_list}
     )
-    return TemplateResponse(
-        request, template_name(model, template_name_suffix), context
+    return _with_validators(
+        TemplateResponse(request, template_name(model, template_name_suffix), context),
+        validators,
     )
 
 
-def render_detail(request, object, context=None, *, template_name_suffix="_detail"):
+def render_detail(
+    request,
+    object,
+    context=None,
+    *,
+    template_name_suffix="_detail",
+    etag=None,
+    last_modified=None,
+):
     """
     Render a single item
 
@@ -85,10 +108,57 @@ def render_detail(request, object, context=None, *, template_name_suffix="_detai
 
     The ``Article`` instance in the example above is passed as ``object``
     AND ``article`` (lowercased model name) into the template.
+
+    ``etag`` (a string) and ``last_modified`` (a datetime) add support for
+    conditional ``GET`` requests: A ``304 Not Modified`` response is returned
+    without rendering the template if the client already has the current
+    version, otherwise the validators are added to the response. Both may
+    also be callables receiving the request and the object::
+
+        return render_detail(
+            request,
+            article,
+            last_modified=lambda request, article: article.updated_at,
+        )
     """
 
+    validators = _validators(request, object, etag, last_modified)
+    if response := _not_modified(request, validators):
+        return response
+
     context = context or {}
     context.update({"object": object, object._meta.model_name: object})
-    return TemplateResponse(
-        request, template_name(object, template_name_suffix), context
+    return _with_validators(
+        TemplateResponse(request, template_name(object, template_name_suffix), context),
+        validators,
     )
+
+
+def _validators(request, object, etag, last_modified):
+    if request.method not in {"GET", "HEAD"}:
+        return None, None
+    if callable(etag):
+        etag = etag(request, object)
+    if callable(last_modified):
+        last_modified = last_modified(request, object)
+    if last_modified:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=dt.timezone.utc)
+        last_modified = int(last_modified.timestamp())
+    return quote_etag(etag) if etag else None, last_modified or None
+
+
+def _not_modified(request, validators):
+    etag, last_modified = validators
+    if etag or last_modified:
+        return get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return None
+
+
+def _with_validators(response, validators):
+    etag, last_modified = validators
+    if etag:
+        response.headers.setdefault("ETag", etag)
+    if last_modified:
+        response.headers.setdefault("Last-Modified", http_date(last_modified))
+    return response
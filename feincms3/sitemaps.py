@@ -0,0 +1,194 @@
+"""
+Streaming sitemaps for page trees
+
+Django's sitemaps framework instantiates all objects of a sitemap section in
+memory. :class:`PageSitemap` streams the XML instead, fetches plain values
+instead of page instances and splits large trees into shards of at most
+50'000 URLs as required by the sitemaps protocol. Translations of pages using
+:class:`~feincms3.mixins.LanguageAndTranslationOfMixin` are added as
+``hreflang`` alternates.
+
+.. code-block:: python
+
+    from feincms3.sitemaps import PageSitemap
+
+    urlpatterns = [
+        path("", include(PageSitemap(Page.objects.all()).urls)),
+        ...
+    ]
+
+The sitemap index is available at ``sitemap.xml``, the shards at
+``sitemap-1.xml``, ``sitemap-2.xml`` etc.
+
+Page instances are never created, so ``get_absolute_url`` isn't called.
+:meth:`PageSitemap.location` builds URLs the same way as
+``AbstractPage.get_absolute_url`` does from the values of the fields listed in
+:attr:`PageSitemap.location_fields`. Page classes overriding
+``get_absolute_url`` have to override ``location`` as well:
+
+.. code-block:: python
+
+    class SiteSitemap(PageSitemap):
+        location_fields = ["path", "site__host"]
+
+        def location(self, request, row):
+            return f"https://{row['site__host']}{row['path']}"
+"""
+
+import itertools
+from xml.sax.saxutils import escape, quoteattr
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path
+
+from feincms3.pages import _page_url
+
+
+class PageSitemap:
+    """
+    Sitemap of all active pages in ``queryset``
+
+    ``queryset`` may also be a callable receiving the request and returning
+    a queryset, e.g. for filtering pages by the current site. Pages with a
+    redirect (see :class:`~feincms3.mixins.RedirectMixin`) are skipped.
+    """
+
+    #: Fields fetched for :meth:`location`
+    location_fields = ["path"]
+
+    def __init__(self, queryset, *, limit=50000, chunk_size=2000):
+        self.queryset = queryset
+        self.limit = limit
+        self.chunk_size = chunk_size
+
+    @property
+    def urls(self):
+        """
+        URL patterns for the sitemap index and its shards
+        """
+        return [
+            path("sitemap.xml", self.index, name="sitemap"),
+            path("sitemap-<int:shard>.xml", self.shard, name="sitemap-shard"),
+        ]
+
+    def get_queryset(self, request):
+        """
+        Return the queryset of pages with an additional ``group`` annotation
+        which is the same for all translations of a page
+        """
+        queryset = self.queryset(request) if callable(self.queryset) else self.queryset
+        fields = {field.name for field in queryset.model._meta.get_fields()}
+        queryset = queryset.active().without_tree_fields()
+        if "redirect_to_url" in fields:
+            queryset = queryset.filter(
+                redirect_to_url="", redirect_to_page__isnull=True
+            )
+        return queryset.annotate(
+            group=Coalesce("translation_of", "pk")
+            if "translation_of" in fields
+            else F("pk")
+        )
+
+    def location(self, request, row):
+        """
+        Return the absolute URL of a page
+
+        ``row`` is a dictionary containing the values of
+        :attr:`location_fields`. The default implementation mirrors
+        ``AbstractPage.get_absolute_url``.
+        """
+        # The fast path returns the same URLs, only faster. Sitemaps contain
+        # many URLs.
+        return request.build_absolute_uri(_page_url(row["path"], fast=True))
+
+    def index(self, request):
+        """
+        Sitemap index view
+        """
+        count = max(1, self.get_queryset(request).count())
+        return self._response(
+            self._sitemapindex(request, range(1, (count - 1) // self.limit + 2))
+        )
+
+    def shard(self, request, shard):
+        """
+        View for the sitemap shard number ``shard``, starting at 1
+        """
+        queryset = self.get_queryset(request)
+        start = (shard - 1) * self.limit
+        if shard < 1 or (shard > 1 and not queryset[start : start + 1].exists()):
+            raise Http404(f"Sitemap shard {shard} does not exist.")
+        return self._response(self._urlset(request, queryset, start))
+
+    def _sitemapindex(self, request, shards):
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        )
+        for shard in shards:
+            location = request.build_absolute_uri(f"sitemap-{shard}.xml")
+            yield f"<sitemap><loc>{escape(location)}</loc></sitemap>\n"
+        yield "</sitemapindex>\n"
+
+    def _urlset(self, request, queryset, start):
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+            ' xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+        )
+
+        has_language_code = "language_code" in {
+            field.name for field in queryset.model._meta.get_fields()
+        }
+        fields = list(
+            dict.fromkeys(
+                [
+                    "group",
+                    "path",
+                    *(["language_code"] if has_language_code else []),
+                    *self.location_fields,
+                ]
+            )
+        )
+        # Ordering by group keeps translations together, so alternates can be
+        # collected while streaming.
+        rows = (
+            queryset.order_by("group", "path")
+            .values(*fields)[start : start + self.limit]
+            .iterator(chunk_size=self.chunk_size)
+        )
+        count = 0
+        for group, group_rows in itertools.groupby(rows, key=lambda row: row["group"]):
+            members = list(group_rows)
+            alternates = members
+            if has_language_code and (
+                (start and not count) or count + len(members) == self.limit
+            ):
+                # Translations of the first and the last page of a shard may
+                # be a part of the neighbouring shards; fetch all of them.
+                alternates = list(
+                    queryset.filter(group=group).order_by("path").values(*fields)
+                )
+            count += len(members)
+
+            for row in members:
+                yield f"<url><loc>{escape(self.location(request, row))}</loc>"
+                if len(alternates) > 1:
+                    for alternate in alternates:
+                        yield (
+                            "<xhtml:link"
+                            ' rel="alternate"'
+                            f" hreflang={quoteattr(alternate['language_code'])}"
+                            f" href={quoteattr(self.location(request, alternate))}"
+                            "/>"
+                        )
+                yield "</url>\n"
+
+        yield "</urlset>\n"
+
+    def _response(self, content):
+        return StreamingHttpResponse(
+            content, content_type="application/xml; charset=utf-8"
+        )
@@ -1,11 +1,15 @@
 import datetime as dt
+import itertools
 import posixpath
+from functools import cache
 from urllib.parse import urlparse
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
 from django.db import models
 from django.utils.http import is_same_domain
+from django.utils.module_loading import import_string
 
 
 def validation_error(error, *, field, exclude, **kwargs):
@@ -20,6 +24,52 @@ def validation_error(error, *, field, exclude, **kwargs):
     )
 
 
+def chunked(iterable, size):
+    """
+    Yield lists of at most ``size`` items from ``iterable``
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def metric(name, value=1, **tags):
+    """
+    Report a metric to the callable configured using the
+    ``FEINCMS3_METRICS_HOOK`` setting (a callable or its dotted Python path)
+
+    The hook receives the name of the metric, a value and tags as keyword
+    arguments. Counters have a value of 1, timers a duration in seconds and
+    gauges the current value. Metrics are dropped if no hook is configured.
+    """
+    if hook := _metrics_hook():
+        hook(name, value, **tags)
+
+
+def metrics_enabled():
+    """
+    Return whether a ``FEINCMS3_METRICS_HOOK`` has been configured, useful to
+    avoid work which is only necessary for reporting metrics
+    """
+    return _metrics_hook() is not None
+
+
+# Resolved once instead of importing dotted paths for each metric
+@cache
+def _metrics_hook():
+    if hook := getattr(settings, "FEINCMS3_METRICS_HOOK", None):
+        return import_string(hook) if isinstance(hook, str) else hook
+    return None
+
+
+def _clear_metrics_hook(*, setting, **kwargs):
+    if setting == "FEINCMS3_METRICS_HOOK":
+        _metrics_hook.cache_clear()
+
+
+setting_changed.connect(_clear_metrics_hook)
+
+
 def is_first_party_link(url, *, first_party_hosts=None):
     """
     Return whether an URL is a first-party link or not.
@@ -81,6 +81,7 @@ class Page(
 
     class Meta(AbstractPage.Meta):
         unique_together = [("language_code", "translation_of")]
+        indexes = PageTypeMixin.recommended_indexes()
 
 
 PagePlugin = create_plugin_base(Page)
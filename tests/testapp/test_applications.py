@@ -1,13 +1,18 @@
+import asyncio
 import sys
+import threading
+import time
 from types import SimpleNamespace
 
 import django
 import pytest
+from asgiref.sync import async_to_sync
 from django.core.checks import Error
 from django.core.exceptions import ValidationError
+from django.db import connection
 from django.template import Context, Template, TemplateSyntaxError
 from django.test.utils import isolate_apps
-from django.urls import NoReverseMatch, reverse
+from django.urls import NoReverseMatch, Resolver404, get_resolver, resolve, reverse
 from django.utils.translation import deactivate_all, override
 from pytest_django.asserts import assertContains, assertRedirects
 
@@ -15,13 +20,16 @@ from feincms3 import applications
 from feincms3.applications import (
     ApplicationType,
     PageTypeMixin,
+    _build_apps_urlconf,
     _del_apps_urlconf_cache,
+    _PrefixDispatchResolver,
     apps_urlconf,
+    apps_urlconf_async,
     reverse_any,
     reverse_app,
     reverse_fallback,
 )
-from feincms3.pages import AbstractPage
+from feincms3.pages import AbstractPage, AbstractPageQuerySet
 from testapp.models import Article, Page
 from testapp.utils import override_urlconf
 
@@ -153,6 +161,256 @@ def test_apps(client):
     )
 
 
+@pytest.mark.django_db
+def test_apps_prefix_dispatch(client, monkeypatch):
+    """Prefix dispatch resolves and reverses exactly like the default"""
+    home_de = Page.objects.create(
+        title="home",
+        slug="home",
+        path="/de/",
+        static_path=True,
+        language_code="de",
+        is_active=True,
+    )
+    Page.objects.create(
+        title="blog",
+        slug="blog",
+        language_code="de",
+        is_active=True,
+        page_type="blog",
+        parent=home_de,
+    )
+    Page.objects.create(
+        title="publications",
+        slug="publications",
+        path="/",
+        static_path=True,
+        language_code="en",
+        is_active=True,
+        page_type="publications",
+    )
+    article = Article.objects.create(title="blog 1", category="blog")
+    paths = [
+        "/de/blog/",
+        f"/de/blog/{article.pk}/",
+        "/de/blog/all/",
+        f"/{article.pk}/",
+        "/all/",
+        "/de/",
+        "/de/blog/nothing/",
+        "/admin/",
+    ]
+
+    _del_apps_urlconf_cache()
+    urlconf = apps_urlconf()
+
+    monkeypatch.setattr(Page, "APPS_PREFIX_DISPATCH", True)
+    _del_apps_urlconf_cache()
+    dispatch_urlconf = apps_urlconf()
+    assert urlconf != dispatch_urlconf
+    assert all(
+        isinstance(pattern, _PrefixDispatchResolver)
+        for pattern in sys.modules[dispatch_urlconf].urlpatterns[:2]
+    )
+
+    def resolve_or_none(path, urlconf):
+        try:
+            match = resolve(path, urlconf)
+        except Resolver404:
+            return None
+        return (match.view_name, match.args, match.kwargs)
+
+    for path in paths:
+        assert resolve_or_none(path, urlconf) == resolve_or_none(path, dispatch_urlconf)
+
+    with override_urlconf(dispatch_urlconf):
+        assert (
+            reverse_app("blog", "article-detail", kwargs={"pk": article.pk})
+            == f"/de/blog/{article.pk}/"
+        )
+
+    assertContains(client.get("/de/blog/"), 'class="article"', 1)
+    assertContains(client.get(f"/de/blog/{article.pk}/"), "<h1>blog 1</h1>")
+
+
+def test_apps_urlconf_single_flight(monkeypatch):
+    """Concurrent requests build a particular apps URLconf module only once"""
+    built = []
+    create = applications._create_apps_urlconf_module
+
+    def slow_create(module_name, apps):
+        built.append(module_name)
+        time.sleep(0.05)
+        return create(module_name, apps)
+
+    monkeypatch.setattr(applications, "_create_apps_urlconf_module", slow_create)
+
+    apps = [("/single-flight/", "blog", "blog", "en")]
+    barrier = threading.Barrier(5)
+    results = []
+
+    def build():
+        barrier.wait()
+        results.append(_build_apps_urlconf(apps))
+
+    threads = [threading.Thread(target=build) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert results == built * 5
+    assert results[0] in sys.modules
+    assert not applications._apps_urlconf_locks
+
+
+@pytest.mark.django_db
+def test_apps_urlconf_prebuild(
+    django_capture_on_commit_callbacks, monkeypatch, apps_validation_models
+):
+    """Saving pages schedules building the apps URLconf if requested"""
+    started = []
+
+    class Thread:
+        def __init__(self, *, target, daemon):
+            self.target = target
+
+        def start(self):
+            started.append(self.target)
+
+    monkeypatch.setattr(applications.threading, "Thread", Thread)
+    monkeypatch.setattr(applications, "_prebuilds", applications._Prebuilds())
+    _home, blog = apps_validation_models
+
+    with django_capture_on_commit_callbacks(execute=True):
+        blog.save()
+    assert started == []
+
+    monkeypatch.setattr(Page, "APPS_URLCONF_PREBUILD", True)
+    with django_capture_on_commit_callbacks(execute=True):
+        blog.save()
+    assert started == [applications._prebuilds.run]
+
+
+@pytest.mark.django_db
+def test_apps_urlconf_prebuild_threads(django_capture_on_commit_callbacks, monkeypatch):
+    """Saving many pages at once starts a single prebuild thread"""
+    builds = []
+    threads = []
+    thread_class = threading.Thread
+    # Builds block until all callbacks have run, otherwise a fast build could
+    # finish (and a new thread could be started) in the meantime
+    done = threading.Event()
+
+    def prebuild():
+        builds.append(1)
+        done.wait(timeout=10)
+
+    def counting_thread(**kwargs):
+        threads.append(thread_class(**kwargs))
+        return threads[-1]
+
+    monkeypatch.setattr(applications.threading, "Thread", counting_thread)
+    monkeypatch.setattr(applications, "_prebuilds", applications._Prebuilds())
+    monkeypatch.setattr(applications, "prebuild_apps_urlconf", prebuild)
+    monkeypatch.setattr(Page, "APPS_URLCONF_PREBUILD", True)
+
+    parent = Page.objects.create(title="parent", slug="parent")
+    for i in range(20):
+        Page.objects.create(title=f"{i}", slug=f"{i}", parent=parent)
+    parent = Page.objects.get(pk=parent.pk)
+    parent.slug = "renamed"
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        parent.save()
+    done.set()
+    assert len(callbacks) > 20
+    for thread in threads:
+        thread.join()
+    assert len(threads) == 1
+    assert 1 <= len(builds) <= 2
+    assert applications._prebuilds.thread is None
+
+
+def test_apps_urlconf_async_single_query(monkeypatch):
+    """Concurrent coroutines share one query for the list of applications"""
+    queries = []
+
+    async def aapplications(self):
+        queries.append(self)
+        await asyncio.sleep(0.01)
+        return [("/async/", "blog", "blog", "en")]
+
+    monkeypatch.setattr(AbstractPageQuerySet, "aapplications", aapplications)
+
+    loop_threads, build_threads = set(), set()
+    build = applications._build_apps_urlconf
+
+    def build_in_thread(apps):
+        build_threads.add(threading.get_ident())
+        return build(apps)
+
+    monkeypatch.setattr(applications, "_build_apps_urlconf", build_in_thread)
+
+    async def urlconfs():
+        loop_threads.add(threading.get_ident())
+        return await asyncio.gather(*(apps_urlconf_async() for _ in range(5)))
+
+    _del_apps_urlconf_cache()
+    urlconfs = async_to_sync(urlconfs)()
+
+    assert len(queries) == 1
+    assert len(set(urlconfs)) == 1
+    assert urlconfs[0] in sys.modules
+    # The module has been built outside the event loop's thread
+    assert build_threads
+    assert not loop_threads & build_threads
+    assert not applications._apps_urlconf_loads
+
+
+@pytest.mark.django_db
+def test_prebuild_apps_urlconf(monkeypatch, apps_validation_models):
+    """prebuild_apps_urlconf builds the module and populates the resolver"""
+    monkeypatch.setattr(applications.connections, "close_all", lambda: None)
+    _del_apps_urlconf_cache()
+
+    urlconf = applications.prebuild_apps_urlconf()
+    assert urlconf in sys.modules
+    assert get_resolver(urlconf)._populated
+    # The cache of applications has been cleared again
+    assert not hasattr(applications._apps_urlconf_cache, "cache")
+
+
+@pytest.mark.django_db
+def test_apps_metrics(client, settings, apps_validation_models):
+    """The metrics hook receives counters, timers and gauges"""
+    metrics = []
+    settings.FEINCMS3_METRICS_HOOK = lambda name, value, **tags: metrics.append(
+        (name, value, tags)
+    )
+
+    _del_apps_urlconf_cache()
+    applications._build_apps_urlconf([("/metrics/", "blog", "blog", "de")])
+    assertContains(client.get("/en/blog/"), "<h1>blog</h1>")
+
+    assert apps_urlconf() == apps_urlconf()
+    with override_urlconf(apps_urlconf()):
+        assert reverse_app(("nothing", "blog"), "article-list") == "/en/blog/"
+        assert reverse_app("nothing", "article-list", fallback="/") == "/"
+
+    names = [name for name, _value, _tags in metrics]
+    assert names.count("feincms3.apps_urlconf.build") == 1
+    assert names.count("feincms3.apps_urlconf.modules") == 1
+    assert "feincms3.apps_urlconf.resolve" in names
+    assert ("feincms3.applications_cache", 1, {"result": "miss"}) in metrics
+    assert ("feincms3.applications_cache", 1, {"result": "hit"}) in metrics
+    attempts = [
+        (value, tags) for name, value, tags in metrics if name.endswith("attempts")
+    ]
+    # en/nothing, en/blog and de/nothing, en/nothing, fr/nothing
+    assert attempts[-2:] == [(2, {"found": True}), (3, {"found": False})]
+
+
 def test_reverse():
     """Test all code paths through reverse_fallback and reverse_any"""
     assert reverse_fallback("test", reverse, "not-exists") == "test"
@@ -417,3 +675,40 @@ def test_unique_page_types():
 
     finally:
         applications._APPS_MODEL = apps_model
+
+
+def query_plan(queryset, label):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        # The label avoids reusing statements prepared before dropping indexes
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql} -- {label}", params)
+        return " ".join(row[-1] for row in cursor.fetchall())
+
+
+@pytest.mark.django_db
+def test_recommended_indexes():
+    """The recommended indexes are used for the hot app lookups"""
+    lookup = Page.objects.without_tree_fields().filter(
+        language_code="en", app_namespace="blog"
+    )
+    applications = Page.objects.active()._applications()
+    names = [index.name for index in Page._meta.indexes]
+
+    # With indexes
+    assert f"INDEX {names[0]} (language_code=? AND app_namespace=?)" in query_plan(
+        lookup, "after"
+    )
+    plan = query_plan(applications, "after")
+    assert f"INDEX {names[1]}" in plan
+    assert "TEMP B-TREE" not in plan
+
+    # Without indexes
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'DROP INDEX "{name}"')
+    # At most the index of unique_together on language_code is used
+    assert "app_namespace=?" not in query_plan(lookup, "before")
+    # Scans all rows (in the order of the unique index on path)
+    plan = query_plan(applications, "before")
+    assert "SCAN testapp_page" in plan
+    assert names[1] not in plan
@@ -0,0 +1,149 @@
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from feincms3.bulk import export_pages, import_pages
+from testapp.models import Page
+
+
+def tree(breadth, depth, prefix="p"):
+    return [
+        {
+            "title": f"{prefix}{i}",
+            "slug": f"{prefix}{i}",
+            "children": tree(breadth, depth - 1, f"{prefix}{i}-") if depth > 1 else [],
+        }
+        for i in range(breadth)
+    ]
+
+
+@pytest.mark.django_db
+def test_import_pages():
+    """Pages are imported with computed paths, positions and namespaces"""
+    count = import_pages(
+        Page,
+        [
+            {
+                "id": 1,
+                "title": "home",
+                "slug": "home",
+                "path": "/",
+                "static_path": True,
+                "is_active": False,
+                "children": [
+                    {"title": "a", "slug": "a", "page_type": "blog"},
+                    {"title": "b", "slug": "b", "position": 5},
+                ],
+            },
+            {"title": "c", "slug": "c", "parent": 1, "language_code": "de"},
+            {"title": "en", "slug": "en", "translation_of": 1, "language_code": "en"},
+        ],
+    )
+    assert count == 5
+
+    home = Page.objects.get(path="/")
+    assert list(
+        Page.objects.values_list(
+            "path", "position", "is_active", "app_namespace", "language_code"
+        )
+    ) == [
+        ("/", 10, False, "", "en"),
+        ("/b/", 5, False, "", "en"),
+        ("/a/", 10, False, "blog", "en"),
+        ("/c/", 20, False, "", "de"),
+        ("/en/", 20, True, "", "en"),
+    ]
+    assert Page.objects.get(path="/en/").translation_of == home
+    assert Page.objects.get(path="/c/").parent == home
+
+    with pytest.raises(ValueError, match="Unknown fields"):
+        import_pages(Page, [{"title": "x", "slug": "x", "unknown": 1}])
+    with pytest.raises(ValueError, match="has to be imported before"):
+        import_pages(Page, [{"title": "x", "slug": "x", "parent": 42}])
+
+
+@pytest.mark.django_db
+def test_import_pages_queries():
+    """The number of queries only depends on the depth of the tree"""
+    with CaptureQueriesContext(connection) as small:
+        assert import_pages(Page, tree(2, 3, "s")) == 14
+    with CaptureQueriesContext(connection) as large:
+        assert import_pages(Page, tree(3, 3, "l")) == 39
+
+    # Savepoint, positions of existing roots, one INSERT per level, release
+    assert len(small.captured_queries) == len(large.captured_queries) == 6
+    assert Page.objects.get(path="/l2/l2-2/l2-2-2/").position == 30
+    assert Page.objects.get(path="/l0/").position == 30
+
+
+@pytest.mark.django_db
+def test_export_pages(django_assert_num_queries):
+    """Exported pages can be imported again"""
+    import_pages(Page, tree(3, 3))
+    root = Page.objects.get(path="/p1/")
+    translation = Page.objects.create(
+        title="p1-de", slug="p1-de", language_code="de", translation_of=root
+    )
+
+    with django_assert_num_queries(1):
+        records = list(export_pages(Page.objects.all()))
+    assert len(records) == 40
+    assert records[0]["title"] == "p0"
+    assert records[1]["parent"] == records[0]["id"]
+
+    records = list(export_pages(Page.objects.descendants(root, include_self=True)))
+    assert [record["path"] for record in records[:2]] == ["/p1/", "/p1/p1-0/"]
+    assert records[0]["parent"] is None
+
+    parent = Page.objects.create(title="copy", slug="copy")
+    assert import_pages(Page, records, parent=parent) == 13
+    assert Page.objects.get(path="/copy/p1/p1-2/p1-2-2/").position == 30
+
+    Page.objects.filter(pk=translation.pk).delete()
+    records = list(export_pages(Page.objects.all()))
+    Page.objects.all().delete()
+    import_pages(Page, records)
+    assert Page.objects.count() == 53
+
+
+@pytest.mark.django_db
+def test_commands(tmp_path):
+    """Page trees can be exported and imported using management commands"""
+    import_pages(Page, tree(2, 2))
+    Page.objects.create(
+        title="de",
+        slug="de",
+        language_code="de",
+        translation_of=Page.objects.get(path="/p0/"),
+    )
+
+    out = io.StringIO()
+    call_command("feincms3_export_pages", "testapp.Page", stdout=out)
+    (tmp_path / "pages.jsonl").write_text(out.getvalue())
+    out = io.StringIO()
+    call_command("feincms3_export_pages", "testapp.Page", format="json", stdout=out)
+    records = json.loads(out.getvalue())
+    assert len(records) == 7
+
+    Page.objects.all().delete()
+    out = io.StringIO()
+    call_command(
+        "feincms3_import_pages",
+        "testapp.Page",
+        str(tmp_path / "pages.jsonl"),
+        stdout=out,
+    )
+    assert out.getvalue() == "Imported 7 pages.\n"
+    assert Page.objects.get(path="/de/").translation_of == Page.objects.get(path="/p0/")
+
+    with pytest.raises(CommandError, match="Parent page 42 does not exist"):
+        call_command(
+            "feincms3_import_pages",
+            "testapp.Page",
+            str(tmp_path / "pages.jsonl"),
+            parent=42,
+        )
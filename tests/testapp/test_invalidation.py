@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from feincms3 import invalidation
+from feincms3.invalidation import check_default_cache
+
+
+def test_versions(monkeypatch):
+    """Version stamps are polled from the cache at most every interval"""
+    invalidation.reset()
+    a = invalidation.version("a")
+    assert invalidation.version("a") == a
+    invalidation.bump("a")
+    assert invalidation.version("a") != a
+
+    a = invalidation.version("a")
+    b = invalidation.version("b")
+    # Changes made by other processes
+    cache.set("feincms3-version-a", "other-a")
+    cache.set("feincms3-version-b", "other-b")
+    with override_settings(FEINCMS3_INVALIDATION_INTERVAL=60000):
+        assert invalidation.version("a") == a
+        assert invalidation.version("b") == b
+
+    calls = []
+    get_many = cache.get_many
+
+    def counting_get_many(keys):
+        calls.append(sorted(keys))
+        return get_many(keys)
+
+    monkeypatch.setattr(cache, "get_many", counting_get_many)
+    with override_settings(FEINCMS3_INVALIDATION_INTERVAL=0):
+        assert invalidation.version("a") == "other-a"
+        assert invalidation.version("b") == "other-b"
+    monkeypatch.undo()
+    # All known stamps are fetched at once
+    assert calls[0] == ["feincms3-version-a", "feincms3-version-b"]
+
+    invalidation.reset()
+    assert invalidation.version("a") == "other-a"
+
+
+def test_check_default_cache():
+    """Process-local and dummy default caches are reported"""
+    assert [error.id for error in check_default_cache()] == ["feincms3.W008"]
+    with override_settings(DEBUG=True):
+        assert check_default_cache() == []
+    with override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+    ):
+        assert [error.id for error in check_default_cache()] == ["feincms3.W009"]
+    with override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache"}}
+    ):
+        assert check_default_cache() == []
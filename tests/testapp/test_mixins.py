@@ -1,7 +1,12 @@
+import io
+
+import pytest
 from content_editor.models import Region, Template
+from django.core.management import CommandError, call_command
 from django.test.utils import isolate_apps
 
-from feincms3.mixins import TemplateMixin
+from feincms3.mixins import RedirectProblem, TemplateMixin
+from testapp.models import Page
 
 
 @isolate_apps("testapp")
@@ -35,3 +40,43 @@ def test_mixin():
     assert {region.key for region in Page(template_key="__notexists").regions} == {
         "main"
     }
+
+
+@pytest.mark.django_db
+def test_redirect_problems(django_assert_num_queries):
+    """Redirect chains and cycles are found using a single query"""
+    out = io.StringIO()
+    call_command("feincms3_validate_redirects", "testapp.Page", stdout=out)
+    assert out.getvalue() == "No redirect problems found.\n"
+
+    pages = {
+        slug: Page.objects.create(title=slug, slug=slug)
+        for slug in ["a", "b", "c", "d", "e", "f", "g", "h"]
+    }
+    for source, target in [("b", "a"), ("c", "b"), ("e", "f"), ("f", "e")]:
+        Page.objects.filter(pk=pages[source].pk).update(redirect_to_page=pages[target])
+    Page.objects.filter(pk=pages["g"].pk).update(redirect_to_page=pages["g"])
+    Page.objects.filter(pk=pages["h"].pk).update(redirect_to_page=pages["e"])
+    Page.objects.filter(pk=pages["d"].pk).update(
+        redirect_to_page=pages["a"], redirect_to_url="/x/"
+    )
+
+    with django_assert_num_queries(1):
+        problems = Page.redirect_problems()
+    assert sorted(problems) == sorted(
+        [
+            RedirectProblem("both", [pages["d"].pk], ["/d/"]),
+            RedirectProblem("cycle", [pages["e"].pk, pages["f"].pk], ["/e/", "/f/"]),
+            RedirectProblem("cycle", [pages["g"].pk], ["/g/"]),
+            RedirectProblem("chain", [pages["c"].pk, pages["b"].pk], ["/c/", "/b/"]),
+            RedirectProblem("chain", [pages["h"].pk, pages["e"].pk], ["/h/", "/e/"]),
+        ]
+    )
+    assert Page.redirect_problems(Page.objects.filter(slug__in=["c", "b"])) == [
+        RedirectProblem("chain", [pages["c"].pk, pages["b"].pk], ["/c/", "/b/"])
+    ]
+
+    out = io.StringIO()
+    with pytest.raises(CommandError, match="Found 5 redirect problems."):
+        call_command("feincms3_validate_redirects", "testapp.Page", stdout=out)
+    assert "chain: /c/ -> /b/\n" in out.getvalue()
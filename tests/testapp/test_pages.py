@@ -1,17 +1,36 @@
+import asyncio
+import datetime as dt
 import re
+import sys
+import types
 
 import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
 from django.contrib.auth.models import User
 from django.core.checks import Warning
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse, HttpResponseNotFound
+from django.template import engines
+from django.template.response import TemplateResponse
+from django.test import RequestFactory
 from django.test.utils import CaptureQueriesContext, isolate_apps, override_settings
-from django.urls import reverse
+from django.urls import include, path, reverse
+from django.utils.functional import SimpleLazyObject
 from pytest_django.asserts import assertContains, assertRedirects
 
-from feincms3 import mixins
-from feincms3.pages import AbstractPage
-from testapp.models import Page
+from feincms3 import invalidation, mixins, pages
+from feincms3.pages import AbstractPage, subtree_changed
+from feincms3.root import middleware as middleware_module
+from feincms3.root.middleware import (
+    add_redirect_handler,
+    cache_page_response,
+    conditional_page_response,
+    create_page_if_404_middleware,
+    create_redirect_map_middleware,
+)
+from testapp.models import Page, RichText
+from testapp.utils import override_urlconf
 
 
 def zero_management_form_data(prefix):
@@ -378,6 +397,70 @@ def test_path_valid_with_static_subpage_path(client):
     )
 
 
+@pytest.mark.django_db
+def test_path_clash_queries():
+    """Path clash checks only fetch the new paths of the branch"""
+    root = Page.objects.create(title="root", slug="root")
+    Page.objects.create(parent=root, title="sub", slug="sub")
+    for slug in ("a", "b", "c"):
+        Page.objects.create(title=slug, slug=slug)
+    new = Page.objects.create(title="new", slug="new")
+    Page.objects.create(
+        title="new-sub", slug="new-sub", static_path=True, path="/new/sub/"
+    )
+
+    root = Page.objects.get(pk=root.pk)
+    root.slug = "new"
+    with (
+        CaptureQueriesContext(connection) as ctx,
+        pytest.raises(ValidationError) as cm,
+    ):
+        root.clean_fields()
+
+    assert cm.value.messages == ["The page root's new path /new/ would not be unique."]
+    [query] = [query for query in ctx.captured_queries if '"path" IN' in query["sql"]]
+    assert "WITH RECURSIVE" not in query["sql"]
+
+    new.slug = "old"
+    new.save()
+    with pytest.raises(ValidationError) as cm:
+        root.clean_fields()
+    assert cm.value.messages == [
+        "The page sub's new path /new/sub/ would not be unique."
+    ]
+
+
+@pytest.mark.django_db
+def test_path_clash_inside_branch():
+    """Nodes of the branch may not clash with each other"""
+    a = Page.objects.create(title="a", slug="a")
+    Page.objects.create(
+        parent=a, title="s", slug="s", static_path=True, path="/x/y/", position=10
+    )
+    Page.objects.create(parent=a, title="y", slug="y", position=20)
+
+    a = Page.objects.get(pk=a.pk)
+    a.slug = "x"
+    with pytest.raises(ValidationError) as cm:
+        a.full_clean()
+    assert cm.value.messages == ["The page y's new path /x/y/ would not be unique."]
+
+
+@pytest.mark.django_db
+def test_path_clash_moving_descendants():
+    """Current paths of pages which are about to change do not clash"""
+    root = Page.objects.create(title="root", slug="a")
+    Page.objects.create(parent=root, title="sub", slug="a")
+    assert list(Page.objects.values_list("path", flat=True)) == ["/a/", "/a/a/"]
+
+    root = Page.objects.get(pk=root.pk)
+    root.static_path = True
+    root.path = "/"
+    root.clean_fields()
+    root.save()
+    assert list(Page.objects.values_list("path", flat=True)) == ["/", "/a/"]
+
+
 @pytest.mark.django_db
 def test_i18n_patterns(client):
     """i18n_patterns in ROOT_URLCONF work even with apps_middleware"""
@@ -634,6 +717,151 @@ def test_descendant_update(prepare_for_move):
     assert p2.path == "/root/p2/"
 
 
+@pytest.mark.django_db
+def test_bulk_descendant_update(monkeypatch, prepare_for_move):
+    """Descendants can be updated in bulk"""
+    monkeypatch.setattr(Page, "DESCENDANT_UPDATES", "bulk")
+    root, p1, p2 = prepare_for_move
+    p3 = Page.objects.create(title="p3", slug="p3", parent=p2)
+    p4 = Page.objects.create(
+        title="p4", slug="p4", parent=p1, static_path=True, path="/p4/"
+    )
+
+    changes = []
+
+    def receiver(sender, instance, pks, **kwargs):
+        changes.append((sender, instance, sorted(pks)))
+
+    subtree_changed.connect(receiver)
+    try:
+        root.slug = "blaaa"
+        with CaptureQueriesContext(connection) as ctx:
+            # Update self, fetch descendants, bulk update changed descendants
+            root.save()
+            assert len(ctx.captured_queries) == 3
+
+        assert changes == [(Page, root, sorted([p1.pk, p2.pk, p3.pk]))]
+        assert list(Page.objects.values_list("path", "is_active")) == [
+            ("/blaaa/", True),
+            ("/blaaa/p1/", True),
+            ("/p4/", True),
+            ("/blaaa/p2/", True),
+            ("/blaaa/p2/p3/", True),
+        ]
+
+        p1 = Page.objects.get(pk=p1.pk)
+        p1.is_active = False
+        p1.save()
+        assert changes[-1] == (Page, p1, [p4.pk])
+        assert list(Page.objects.values_list("path", "is_active")) == [
+            ("/blaaa/", True),
+            ("/blaaa/p1/", False),
+            ("/p4/", False),
+            ("/blaaa/p2/", True),
+            ("/blaaa/p2/p3/", True),
+        ]
+
+    finally:
+        subtree_changed.disconnect(receiver)
+
+
+@pytest.mark.django_db
+def test_sql_descendant_update_case(monkeypatch):
+    """Path prefixes are compared case-sensitively"""
+    monkeypatch.setattr(Page, "DESCENDANT_UPDATES", "sql")
+    about = Page.objects.create(title="about", slug="about")
+    Page.objects.create(title="child", slug="child", parent=about)
+    other = Page.objects.create(title="About", slug="About")
+    Page.objects.create(title="other", slug="other", parent=other)
+    Page.objects.create(
+        title="static", slug="static", parent=other, static_path=True, path="/about/s/"
+    )
+
+    about.slug = "x"
+    about.save()
+    assert sorted(Page.objects.values_list("path", flat=True)) == [
+        "/About/",
+        "/About/other/",
+        "/about/s/",
+        "/x/",
+        "/x/child/",
+    ]
+
+
+@pytest.mark.django_db
+def test_sql_descendant_update(monkeypatch, prepare_for_move):
+    """Descendants' paths can be rewritten by the database"""
+    monkeypatch.setattr(Page, "DESCENDANT_UPDATES", "sql")
+    root, p1, p2 = prepare_for_move
+    Page.objects.create(title="p3", slug="p3", parent=p2)
+    p4 = Page.objects.create(
+        title="p4", slug="p4", parent=p1, static_path=True, path="/p4/"
+    )
+    Page.objects.create(title="p5", slug="p5", parent=p4)
+    p6 = Page.objects.create(
+        title="p6", slug="p6", parent=p1, static_path=True, path="/root/p6/"
+    )
+    Page.objects.create(title="p7", slug="p7", parent=p6)
+
+    def paths():
+        return list(Page.objects.values_list("path", "is_active"))
+
+    root = Page.objects.get(pk=root.pk)
+    with CaptureQueriesContext(connection) as ctx:
+        # Only update self
+        root.save()
+        assert len(ctx.captured_queries) == 1
+
+    root.slug = "blaaa"
+    with CaptureQueriesContext(connection) as ctx:
+        # Update self, fetch static paths, update descendants
+        root.save()
+        assert len(ctx.captured_queries) == 3
+
+    assert paths() == [
+        ("/blaaa/", True),
+        ("/blaaa/p1/", True),
+        ("/p4/", True),
+        ("/p4/p5/", True),
+        ("/root/p6/", True),
+        ("/root/p6/p7/", True),
+        ("/blaaa/p2/", True),
+        ("/blaaa/p2/p3/", True),
+    ]
+
+    # Renaming again uses the path which has been saved last
+    root.slug = "root"
+    root.save()
+    p1 = Page.objects.get(pk=p1.pk)
+    p1.is_active = False
+    p1.save()
+    assert paths() == [
+        ("/root/", True),
+        ("/root/p1/", False),
+        ("/p4/", False),
+        ("/p4/p5/", False),
+        ("/root/p6/", False),
+        ("/root/p6/p7/", False),
+        ("/root/p2/", True),
+        ("/root/p2/p3/", True),
+    ]
+
+    # Forced updates recompute everything
+    Page.objects.filter(pk=p2.pk).update(path="/broken/")
+    root.save(save_descendants=True)
+    assert Page.objects.get(pk=p2.pk).path == "/root/p2/"
+
+
+@isolate_apps("testapp")
+def test_invalid_descendant_updates():
+    """Only known values are accepted for DESCENDANT_UPDATES"""
+
+    class Page(AbstractPage):
+        DESCENDANT_UPDATES = "magic"
+
+    assert [error.id for error in Page.check()] == ["feincms3.E007"]
+
+
 @pytest.mark.django_db
 def test_move_view_redirect(client):
     """Move view redirects as expected when encountering an invalid PK"""
@@ -855,3 +1083,769 @@ def test_append_slash(client):
     with override_settings(APPEND_SLASH=False):
         response = client.get("/home")
         assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_branch_values(prepare_for_move):
+    """The values-based branch matches the instance-based branch"""
+    root, p1, p2 = prepare_for_move
+    p3 = Page.objects.create(title="p3", slug="p3", parent=p2)
+    Page.objects.create(title="p4", slug="p4", parent=p1, static_path=True, path="/p4/")
+
+    root.slug = "blaaa"
+    p2 = Page.objects.get(pk=p2.pk)
+    p2.is_active = False
+    for page in [root, p2, p3]:
+        page.path = f"{page.parent.path if page.parent else '/'}{page.slug}/"
+        assert list(page._branch_values().items()) == [
+            (
+                pk,
+                (
+                    node.path,
+                    node.is_active,
+                    pk == page.pk
+                    or (node.is_active, node.path) != node._save_descendants_cache,
+                ),
+            )
+            for pk, node in page._branch_for_update().items()
+        ]
+
+
+@pytest.mark.django_db
+def test_tree_snapshot(django_assert_num_queries):
+    """Page tree snapshots are built once and rebuilt after changes"""
+    home = Page.objects.create(
+        title="home", slug="home", path="/de/", static_path=True, language_code="de"
+    )
+    a = Page.objects.create(
+        title="a", slug="a", parent=home, language_code="de", menu="main"
+    )
+    b = Page.objects.create(
+        title="b", slug="b", parent=home, language_code="de", menu="footer"
+    )
+    a1 = Page.objects.create(title="a1", slug="a1", parent=a, language_code="de")
+    Page.objects.create(title="inactive", slug="inactive", parent=a, is_active=False)
+    en = Page.objects.create(
+        title="en", slug="en", path="/en/", static_path=True, language_code="en"
+    )
+
+    with django_assert_num_queries(1):
+        snapshot = Page.tree_snapshot()
+    with django_assert_num_queries(0):
+        assert Page.tree_snapshot() is snapshot
+
+        assert [(node.pk, node.tree_depth) for node in snapshot] == [
+            (home.pk, 0),
+            (a.pk, 1),
+            (a1.pk, 2),
+            (b.pk, 1),
+            (en.pk, 0),
+        ]
+        assert snapshot.roots() == [snapshot.get(home.pk), snapshot.get(en.pk)]
+        assert snapshot.menu("footer") == [snapshot.get(b.pk)]
+        assert snapshot.menu("main", max_depth=0) == snapshot.roots()
+        assert [node.title for node in snapshot.get(home.pk).children] == ["a", "b"]
+
+        node = snapshot.get_by_path("/de/a/a1/")
+        assert node.pk == a1.pk
+        assert node.parent_id == a.pk
+        assert node.tree_path == [home.pk, a.pk, a1.pk]
+        assert node.ancestors() == [snapshot.get(home.pk), snapshot.get(a.pk)]
+        assert node.get_absolute_url() == "/de/a/a1/"
+        assert snapshot.get(home.pk).descendants() == [
+            snapshot.get(a.pk),
+            snapshot.get(a1.pk),
+            snapshot.get(b.pk),
+        ]
+        assert snapshot.get(a.pk).descendants(include_self=True) == [
+            snapshot.get(a.pk),
+            snapshot.get(a1.pk),
+        ]
+        assert snapshot.get(12345) is None
+
+    with django_assert_num_queries(1):
+        assert [node.pk for node in Page.tree_snapshot("en")] == [en.pk]
+    with django_assert_num_queries(0):
+        Page.tree_snapshot("en")
+
+    b.title = "bb"
+    b.save()
+    with django_assert_num_queries(1):
+        snapshot = Page.tree_snapshot()
+    assert snapshot.get(b.pk).title == "bb"
+
+    Page.objects.filter(pk=a1.pk).delete()
+    assert a1.pk not in Page.tree_snapshot()
+
+    Page.objects.filter(pk=b.pk).update(title="bbb")
+    assert Page.tree_snapshot().get(b.pk).title == "bb"
+    Page.bump_tree_version()
+    assert Page.tree_snapshot().get(b.pk).title == "bbb"
+
+
+@pytest.mark.django_db
+def test_by_path_queries(django_assert_num_queries):
+    """Ancestors and descendants can be fetched without the recursive CTE"""
+    home = Page.objects.create(title="home", slug="home", path="/", static_path=True)
+    a = Page.objects.create(title="a", slug="a", parent=home)
+    a1 = Page.objects.create(title="a1", slug="a1", parent=a)
+    x = Page.objects.create(
+        title="x", slug="x", parent=a1, path="/x/", static_path=True
+    )
+    x1 = Page.objects.create(title="x1", slug="x1", parent=x)
+
+    assert list(Page.objects.ancestors_by_path(a1)) == [home, a]
+    assert list(Page.objects.ancestors_by_path(a1, include_self=True)) == [
+        home,
+        a,
+        a1,
+    ]
+    # Static paths: The descendants of a1 aren't below its path, x is
+    assert list(Page.objects.descendants_by_path(a)) == [a1]
+    assert list(Page.objects.descendants_by_path(x, include_self=True)) == [x, x1]
+
+    with django_assert_num_queries(1) as ctx:
+        assert a1.breadcrumbs() == [home, a, a1]
+    assert "WITH RECURSIVE" not in ctx.captured_queries[0]["sql"]
+
+    # The parent chain of x1 isn't complete, fall back to the CTE (which needs
+    # the tree_path of x1 as well)
+    with django_assert_num_queries(3):
+        assert x1.breadcrumbs(include_self=False) == [home, a, a1, x]
+
+
+@pytest.mark.django_db
+def test_descendants_by_path_case():
+    """Descendants by path are matched case-sensitively"""
+    about = Page.objects.create(title="about", slug="about")
+    Page.objects.create(title="child", slug="child", parent=about)
+    other = Page.objects.create(title="About", slug="About")
+    other1 = Page.objects.create(title="other", slug="other", parent=other)
+
+    assert list(Page.objects.descendants_by_path(other)) == [other1]
+    assert list(Page.objects.descendants_by_path(other, include_self=True)) == [
+        other,
+        other1,
+    ]
+
+
+@pytest.mark.django_db
+def test_fast_absolute_url(monkeypatch):
+    """get_absolute_url only tries reversing if the pages namespace exists"""
+    monkeypatch.setattr(Page, "FAST_ABSOLUTE_URL", True)
+    calls = []
+
+    def reverse(*args, **kwargs):
+        calls.append(kwargs)
+        return pages_reverse(*args, **kwargs)
+
+    pages_reverse = pages.reverse
+    monkeypatch.setattr(pages, "reverse", reverse)
+
+    root = Page.objects.create(title="root", slug="root", path="/", static_path=True)
+    page = Page.objects.create(title="page", slug="page", parent=root)
+
+    assert page.get_absolute_url() == "/page/"
+    assert root.get_absolute_url() == "/"
+    assert calls == []
+
+    urlconf = types.ModuleType("pages_urlconf")
+    urlconf.urlpatterns = [
+        path(
+            "p/",
+            include(
+                (
+                    [
+                        path("", lambda request: None, name="root"),
+                        path("<path:path>/", lambda request: None, name="page"),
+                    ],
+                    "pages",
+                )
+            ),
+        )
+    ]
+    with override_urlconf(urlconf):
+        assert page.get_absolute_url() == "/p/page/"
+        assert page.get_absolute_url() == "/p/page/"
+        assert root.get_absolute_url() == "/p/"
+    assert calls == [{"kwargs": {"path": "page"}}, {}]
+
+    # Changing ROOT_URLCONF clears the memoized URLs
+    for prefix in ["p", "q"]:
+        root_urlconf = types.ModuleType("pages_urlconf")
+        root_urlconf.urlpatterns = [
+            path(
+                f"{prefix}/",
+                include(
+                    (
+                        [path("<path:path>/", lambda request: None, name="page")],
+                        "pages",
+                    )
+                ),
+            )
+        ]
+        monkeypatch.setitem(sys.modules, "pages_urlconf", root_urlconf)
+        with override_settings(ROOT_URLCONF="pages_urlconf"):
+            assert page.get_absolute_url() == f"/{prefix}/page/"
+
+
+@pytest.mark.django_db
+def test_404_single_query(client):
+    """The root middleware fetches all candidates using one query"""
+    Page.objects.create(
+        title="de",
+        slug="de",
+        path="/de/",
+        static_path=True,
+        language_code="de",
+    )
+
+    def get(*args, **kwargs):
+        queries = []
+
+        def wrapper(execute, sql, params, many, context):
+            if '"testapp_page"."path" IN' in sql:
+                queries.append(params)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            return client.get(*args, **kwargs), queries
+
+    response, queries = get("/", HTTP_ACCEPT_LANGUAGE="de")
+    assertRedirects(response, "/de/")
+    assert len(queries) == 1
+
+    response, queries = get("/de")
+    assertRedirects(response, "/de/", status_code=301)
+    assert len(queries) == 1
+
+    response, queries = get("/de/")
+    assert response.status_code == 200
+    assert len(queries) == 1
+
+
+def root_middleware(**kwargs):
+    middleware = create_page_if_404_middleware(
+        queryset=Page.objects.active(),
+        handler=lambda request, page: HttpResponse(page.title),
+        **kwargs,
+    )(lambda request: HttpResponseNotFound())
+
+    def get(url):
+        request = RequestFactory().get(url)
+        request.resolver_match = None
+        return middleware(request)
+
+    return get
+
+
+@pytest.mark.django_db
+def test_404_miss_cache(django_assert_num_queries):
+    """Paths which didn't match any page are remembered"""
+    get = root_middleware(miss_cache_size=2)
+    for url in ["/a/", "/b/", "/c/"]:
+        with django_assert_num_queries(1):
+            assert get(url).status_code == 404
+    with django_assert_num_queries(0):
+        assert get("/c/").status_code == 404
+    # Evicted
+    with django_assert_num_queries(1):
+        assert get("/a/").status_code == 404
+
+    Page.objects.create(title="c", slug="c")
+    with django_assert_num_queries(1):
+        assert get("/c/").content == b"c"
+
+    # The shared cache remembers misses of other processes
+    get = root_middleware(miss_cache_size=1, shared_cache="default")
+    with django_assert_num_queries(1):
+        assert get("/x/").status_code == 404
+    get = root_middleware(miss_cache_size=1, shared_cache="default")
+    with django_assert_num_queries(0):
+        assert get("/x/").status_code == 404
+
+
+@pytest.mark.django_db
+def test_404_page_cache(django_assert_num_queries):
+    """Pages are cached by path"""
+    page = Page.objects.create(title="a", slug="a")
+    get = root_middleware(page_cache_size=10, miss_cache_size=10)
+    with django_assert_num_queries(1):
+        assert get("/a/").content == b"a"
+    with django_assert_num_queries(0):
+        assert get("/a/").content == b"a"
+        assert get("/a/").content == b"a"
+
+    page.title = "b"
+    page.save()
+    with django_assert_num_queries(1):
+        assert get("/a/").content == b"b"
+
+    handled = []
+    middleware = create_page_if_404_middleware(
+        queryset=lambda request: Page.objects.filter(language_code=request.GET["l"]),
+        handler=lambda request, page: handled.append(page) or HttpResponse(),
+        page_cache_size=10,
+    )(lambda request: HttpResponseNotFound())
+
+    for language_code, queries in [("en", 1), ("de", 1), ("en", 0), ("de", 1)]:
+        request = RequestFactory().get("/a/", {"l": language_code})
+        request.resolver_match = None
+        with django_assert_num_queries(queries):
+            middleware(request)
+
+    # Only the English requests found the page; handlers receive copies
+    assert handled == [page, page]
+    assert handled[0] is not handled[1]
+    assert handled[1].tree_path == [page.pk]
+
+
+@pytest.mark.django_db
+def test_404_async():
+    """The root middleware supports async handlers and get_response"""
+    a = Page.objects.create(title="a", slug="a")
+    Page.objects.create(title="b", slug="b", redirect_to_page=a)
+
+    @add_redirect_handler
+    async def handler(request, page):
+        return HttpResponse(page.title)
+
+    async def get_response(request):
+        return HttpResponseNotFound()
+
+    def get(middleware, url):
+        request = RequestFactory().get(url)
+        request.resolver_match = None
+        return async_to_sync(middleware)(request)
+
+    middleware = create_page_if_404_middleware(
+        queryset=Page.objects.active(), handler=handler, page_cache_size=10
+    )(get_response)
+    assert iscoroutinefunction(middleware)
+    assert get(middleware, "/a/").content == b"a"
+    assert get(middleware, "/a/").content == b"a"
+    assert get(middleware, "/b/")["Location"] == "/a/"
+    assert get(middleware, "/a").status_code == 301
+    assert get(middleware, "/c/").status_code == 404
+
+    # Sync handlers with async get_response and vice versa
+    middleware = create_page_if_404_middleware(
+        queryset=Page.objects.active(),
+        handler=lambda request, page: HttpResponse(page.title),
+    )(get_response)
+    assert get(middleware, "/a/").content == b"a"
+
+    middleware = create_page_if_404_middleware(
+        queryset=Page.objects.active(), handler=handler
+    )(lambda request: HttpResponseNotFound())
+    assert not iscoroutinefunction(middleware)
+    request = RequestFactory().get("/b/")
+    request.resolver_match = None
+    assert middleware(request)["Location"] == "/a/"
+
+
+@pytest.mark.django_db
+def test_404_page_first(django_assert_num_queries):
+    """Page-first mode skips the view for known page paths"""
+    Page.objects.create(title="a", slug="a")
+    Page.objects.create(title="blog", slug="blog", page_type="blog")
+    calls = []
+
+    def get_response(request):
+        calls.append(request.path)
+        return HttpResponseNotFound()
+
+    middleware = create_page_if_404_middleware(
+        queryset=Page.objects.active(),
+        handler=lambda request, page: HttpResponse(page.title),
+        page_first=True,
+    )(get_response)
+
+    def get(url):
+        request = RequestFactory().get(url)
+        request.resolver_match = None
+        return middleware(request)
+
+    # The set of paths and the page
+    with django_assert_num_queries(2):
+        assert get("/a/").content == b"a"
+    with django_assert_num_queries(1):
+        assert get("/a/").content == b"a"
+    assert calls == []
+
+    # App pages and unknown paths go through Django
+    assert get("/blog/").content == b"blog"
+    assert get("/b/").status_code == 404
+    assert get("/a").status_code == 301
+    assert calls == ["/blog/", "/b/", "/a"]
+
+    Page.objects.create(title="b", slug="b")
+    calls.clear()
+    assert get("/b/").content == b"b"
+    assert calls == []
+
+
+@pytest.mark.django_db
+def test_cache_page_response():
+    """Responses are cached until pages or their plugins change"""
+    page = Page.objects.create(title="a", slug="a")
+    calls = []
+
+    @cache_page_response(vary=["Accept-Language"])
+    def handler(request, page):
+        calls.append(request.get_full_path())
+        response = HttpResponse(page.title)
+        if "cookie" in request.GET:
+            response.set_cookie("a", "b")
+        if "session" in request.GET:
+            request.session.accessed = True
+        if "csrf" in request.GET:
+            request.META["CSRF_COOKIE_NEEDS_UPDATE"] = True
+        return response
+
+    def get(url, *, is_authenticated=False, **kwargs):
+        request = RequestFactory().get(url, **kwargs)
+        request.user = types.SimpleNamespace(is_authenticated=is_authenticated)
+        request.session = types.SimpleNamespace(accessed=False)
+        return handler(request, Page.objects.get(pk=page.pk))
+
+    assert get("/a/").content == b"a"
+    assert get("/a/").content == b"a"
+    assert get("/a/")["Vary"] == "Accept-Language"
+    assert get("/a/", headers={"Accept-Language": "de"}).content == b"a"
+    assert get("/a/?page=2").content == b"a"
+    assert get("/a/", secure=True).content == b"a"
+    assert calls == ["/a/", "/a/", "/a/?page=2", "/a/"]
+
+    calls.clear()
+    get("/a/?cookie=1")
+    get("/a/?cookie=1")
+    get("/a/?session=1")
+    get("/a/?session=1")
+    get("/a/?csrf=1")
+    get("/a/?csrf=1")
+    get("/a/", is_authenticated=True)
+    request = RequestFactory().post("/a/")
+    handler(request, page)
+    assert calls == [
+        "/a/?cookie=1",
+        "/a/?cookie=1",
+        "/a/?session=1",
+        "/a/?session=1",
+        "/a/?csrf=1",
+        "/a/?csrf=1",
+        "/a/",
+        "/a/",
+    ]
+
+    calls.clear()
+    RichText.objects.create(parent=page, region="main", ordering=10, text="")
+    get("/a/")
+    get("/a/")
+    page.title = "b"
+    page.save()
+    assert get("/a/").content == b"b"
+    assert calls == ["/a/", "/a/"]
+
+    @cache_page_response
+    async def ahandler(request, page):
+        calls.append(request.get_full_path())
+        return HttpResponse(page.title)
+
+    calls.clear()
+    request = RequestFactory().get("/async/")
+    assert async_to_sync(ahandler)(request, page).content == b"b"
+    assert async_to_sync(ahandler)(request, page).content == b"b"
+    assert calls == ["/async/"]
+
+
+@pytest.mark.django_db
+def test_conditional_page_response():
+    """Page handlers answer conditional requests without rendering"""
+    page = Page.objects.create(title="a", slug="a")
+    calls = []
+
+    @conditional_page_response
+    def handler(request, page):
+        calls.append(page.title)
+        return HttpResponse(page.title)
+
+    def get(**headers):
+        return handler(RequestFactory().get("/a/", headers=headers), page)
+
+    etag = get()["ETag"]
+    assert get(if_none_match=etag).status_code == 304
+    assert calls == ["a"]
+
+    RichText.objects.create(parent=page, region="main", ordering=10, text="")
+    assert get(if_none_match=etag).status_code == 200
+    etag = get()["ETag"]
+    page.title = "b"
+    page.save()
+    assert get(if_none_match=etag).content == b"b"
+
+    @conditional_page_response(last_modified=lambda request, page: page.modified)
+    async def ahandler(request, page):
+        return HttpResponse(page.title)
+
+    page.modified = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+    request = RequestFactory().get("/a/")
+    response = async_to_sync(ahandler)(request, page)
+    assert response["Last-Modified"] == "Thu, 01 Jan 2026 00:00:00 GMT"
+    request = RequestFactory().get(
+        "/a/", headers={"If-Modified-Since": response["Last-Modified"]}
+    )
+    assert async_to_sync(ahandler)(request, page).status_code == 304
+
+
+@pytest.mark.django_db
+def test_redirect_map_middleware(django_assert_num_queries):
+    """Redirects are answered from a map without per-request queries"""
+    a = Page.objects.create(title="a", slug="a")
+    b = Page.objects.create(title="b", slug="b", redirect_to_page=a)
+    Page.objects.create(title="c", slug="c", redirect_to_url="https://example.com/")
+
+    middleware = create_redirect_map_middleware(queryset=Page.objects.active())(
+        lambda request: HttpResponse("view")
+    )
+
+    def get(url):
+        return middleware(RequestFactory().get(url))
+
+    with django_assert_num_queries(1):
+        assert get("/b/")["Location"] == "/a/"
+    with django_assert_num_queries(0):
+        assert get("/c/")["Location"] == "https://example.com/"
+        assert get("/a/").content == b"view"
+        assert get("/d/").content == b"view"
+
+    b.redirect_to_page = None
+    b.redirect_to_url = "/elsewhere/"
+    b.save()
+    assert get("/b/")["Location"] == "/elsewhere/"
+
+    async def get_response(request):
+        return HttpResponse("view")
+
+    middleware = create_redirect_map_middleware(
+        queryset=lambda request: Page.objects.active()
+    )(get_response)
+    assert iscoroutinefunction(middleware)
+    response = async_to_sync(middleware)(RequestFactory().get("/b/"))
+    assert response["Location"] == "/elsewhere/"
+    response = async_to_sync(middleware)(RequestFactory().get("/a/"))
+    assert response.content == b"view"
+
+    b.redirect_to_url = ""
+    b.redirect_to_page = a
+    b.save()
+    middleware = create_redirect_map_middleware(
+        queryset=Page.objects.active(),
+        target_fields=["path", "title"],
+        target_url=lambda request, target: f"https://{target['title']}.example.com/",
+    )(lambda request: HttpResponse("view"))
+    assert get("/b/")["Location"] == "https://a.example.com/"
+
+
+@pytest.mark.django_db
+def test_redirect_map_query_key(monkeypatch):
+    """The SQL of querysets which aren't callables is only compiled once"""
+    a = Page.objects.create(title="a", slug="a")
+    Page.objects.create(title="b", slug="b", redirect_to_page=a)
+    calls = []
+
+    def query_key(qs):
+        calls.append(qs)
+        return _query_key(qs)
+
+    _query_key = middleware_module._query_key
+    monkeypatch.setattr(middleware_module, "_query_key", query_key)
+
+    middleware = create_redirect_map_middleware(queryset=Page.objects.active())(
+        lambda request: HttpResponse("view")
+    )
+    for _ in range(3):
+        assert middleware(RequestFactory().get("/b/"))["Location"] == "/a/"
+    assert len(calls) == 1
+
+    middleware = create_redirect_map_middleware(
+        queryset=lambda request: Page.objects.active()
+    )(lambda request: HttpResponse("view"))
+    for _ in range(3):
+        assert middleware(RequestFactory().get("/b/"))["Location"] == "/a/"
+    assert len(calls) == 4
+
+
+@pytest.mark.django_db
+def test_redirect_map_without_version(django_assert_num_queries):
+    """The redirect map is skipped if the cache doesn't store version stamps"""
+    a = Page.objects.create(title="a", slug="a")
+    Page.objects.create(title="b", slug="b", redirect_to_page=a)
+    middleware = create_redirect_map_middleware(queryset=Page.objects.active())(
+        lambda request: HttpResponse("view")
+    )
+    invalidation.reset()
+    with (
+        override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            },
+            FEINCMS3_INVALIDATION_INTERVAL=0,
+        ),
+        django_assert_num_queries(0),
+    ):
+        assert middleware(RequestFactory().get("/b/")).content == b"view"
+    invalidation.reset()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_404_async_queryset_callable():
+    """Queryset callables may use the database under ASGI"""
+    Page.objects.create(title="a", slug="a", is_active=False)
+
+    def pages(request):
+        if request.user.is_staff:
+            return Page.objects.all()
+        return Page.objects.active()
+
+    async def get_response(request):
+        return HttpResponseNotFound()
+
+    middleware = create_page_if_404_middleware(
+        queryset=pages,
+        handler=lambda request, page: HttpResponse(page.title),
+        miss_cache_size=10,
+        shared_cache="default",
+    )(get_response)
+
+    def get(url, user):
+        request = RequestFactory().get(url)
+        request.resolver_match = None
+        # Like django.contrib.auth's middleware, loading the user lazily
+        request.user = SimpleLazyObject(lambda: User.objects.get(username=user))
+        return async_to_sync(middleware)(request)
+
+    User.objects.create(username="staff", is_staff=True)
+    User.objects.create(username="visitor")
+    assert get("/a/", "visitor").status_code == 404
+    assert get("/a/", "staff").content == b"a"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_version_off_event_loop(monkeypatch):
+    """Version stamps aren't read on the event loop"""
+    a = Page.objects.create(title="a", slug="a")
+    Page.objects.create(title="b", slug="b", redirect_to_page=a)
+    tree_version = Page.tree_version
+
+    def version(cls):
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+        return tree_version()
+
+    monkeypatch.setattr(Page, "tree_version", classmethod(version))
+
+    async def get_response(request):
+        return HttpResponseNotFound()
+
+    middleware = create_page_if_404_middleware(
+        queryset=Page.objects.active(),
+        handler=lambda request, page: HttpResponse(page.title),
+        miss_cache_size=10,
+        page_first=True,
+    )(get_response)
+    request = RequestFactory().get("/a/")
+    request.resolver_match = None
+    assert async_to_sync(middleware)(request).content == b"a"
+
+    middleware = create_redirect_map_middleware(queryset=Page.objects.active())(
+        get_response
+    )
+    response = async_to_sync(middleware)(RequestFactory().get("/b/"))
+    assert response["Location"] == "/a/"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_404_template_response():
+    """Template responses returned by handlers are rendered"""
+    Page.objects.create(title="a", slug="a")
+    template = engines["django"].from_string("{{ page.title }}!")
+
+    def handler(request, page):
+        return TemplateResponse(request, template, {"page": page})
+
+    async def ahandler(request, page):
+        return TemplateResponse(request, template, {"page": page})
+
+    async def get_response(request):
+        return HttpResponseNotFound()
+
+    for page_first in [False, True]:
+        for h in [handler, ahandler]:
+            request = RequestFactory().get("/a/")
+            request.resolver_match = None
+            middleware = create_page_if_404_middleware(
+                queryset=Page.objects.active(), handler=h, page_first=page_first
+            )
+            response = middleware(lambda request: HttpResponseNotFound())(request)
+            assert response.content == b"a!"
+            response = async_to_sync(middleware(get_response))(request)
+            assert response.content == b"a!"
+
+
+@pytest.mark.django_db
+def test_404_caches_without_version(django_assert_num_queries):
+    """Nothing is cached if the cache doesn't store version stamps"""
+    invalidation.reset()
+    with override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+        FEINCMS3_INVALIDATION_INTERVAL=0,
+    ):
+        assert Page.tree_version() is None
+        get = root_middleware(miss_cache_size=10, page_cache_size=10, page_first=True)
+        assert get("/new/").status_code == 404
+        Page.objects.create(title="new", slug="new")
+        # The paths of all pages aren't loaded without a version stamp
+        with django_assert_num_queries(1):
+            assert get("/new/").content == b"new"
+        Page.objects.filter(slug="new").update(title="changed")
+        assert get("/new/").content == b"changed"
+    invalidation.reset()
+
+
+@pytest.mark.django_db
+def test_conditional_page_response_without_version():
+    """No ETag is sent if the cache doesn't store version stamps"""
+    page = Page.objects.create(title="a", slug="a")
+    handler = conditional_page_response(lambda request, page: HttpResponse(page.title))
+    invalidation.reset()
+    with override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}},
+        FEINCMS3_INVALIDATION_INTERVAL=0,
+    ):
+        response = handler(RequestFactory().get("/a/"), page)
+        assert "ETag" not in response
+        request = RequestFactory().get("/a/", headers={"If-None-Match": "*"})
+        assert handler(request, page).status_code == 200
+    invalidation.reset()
+
+
+@pytest.mark.django_db
+def test_cache_page_response_without_version():
+    """Responses aren't cached if the cache doesn't store version stamps"""
+    page = Page.objects.create(title="a", slug="a")
+    handler = cache_page_response(
+        lambda request, page: HttpResponse(page.title), cache_alias="responses"
+    )
+    invalidation.reset()
+    with override_settings(
+        CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            "responses": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        },
+        FEINCMS3_INVALIDATION_INTERVAL=0,
+    ):
+        assert handler(RequestFactory().get("/a/"), page).content == b"a"
+        page.title = "b"
+        assert handler(RequestFactory().get("/a/"), page).content == b"b"
+    invalidation.reset()
@@ -0,0 +1,97 @@
+import re
+
+import pytest
+from django.http import Http404
+from django.test import RequestFactory
+
+from feincms3.sitemaps import PageSitemap
+from testapp.models import Page
+
+
+def content(response):
+    return b"".join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+def test_sitemap(django_assert_num_queries):
+    """Sitemaps are sharded and contain translations as alternates"""
+    en = Page.objects.create(
+        title="en", slug="en", path="/en/", static_path=True, language_code="en"
+    )
+    de = Page.objects.create(
+        title="de",
+        slug="de",
+        path="/de/",
+        static_path=True,
+        language_code="de",
+        translation_of=en,
+    )
+    for i in range(3):
+        page = Page.objects.create(title=f"{i}", slug=f"{i}", parent=en)
+        Page.objects.create(
+            title=f"{i}",
+            slug=f"{i}",
+            parent=de,
+            language_code="de",
+            translation_of=page,
+        )
+    Page.objects.create(title="inactive", slug="inactive", parent=en, is_active=False)
+    Page.objects.create(
+        title="redirect", slug="redirect", parent=en, redirect_to_page=en
+    )
+
+    sitemap = PageSitemap(Page.objects.all(), limit=3)
+    request = RequestFactory().get("/sitemap.xml")
+
+    with django_assert_num_queries(1):
+        index = content(sitemap.index(request))
+    assert re.findall(r"<loc>([^<]+)</loc>", index) == [
+        "http://testserver/sitemap-1.xml",
+        "http://testserver/sitemap-2.xml",
+        "http://testserver/sitemap-3.xml",
+    ]
+
+    request = RequestFactory().get("/sitemap-2.xml")
+    with django_assert_num_queries(4):
+        # Existence check, shard, translations of first and last page
+        shard = content(sitemap.shard(request, 2))
+    assert re.findall(r"<loc>([^<]+)</loc>", shard) == [
+        "http://testserver/en/0/",
+        "http://testserver/de/1/",
+        "http://testserver/en/1/",
+    ]
+    assert shard.count('<xhtml:link rel="alternate"') == 6
+    assert (
+        '<xhtml:link rel="alternate" hreflang="de" href="http://testserver/de/0/"/>'
+        in shard
+    )
+
+    with django_assert_num_queries(2):
+        shard = content(sitemap.shard(request, 1))
+    assert "/en/</loc>" in shard
+
+    with pytest.raises(Http404):
+        sitemap.shard(request, 4)
+    with pytest.raises(Http404):
+        sitemap.shard(request, 0)
+
+    sitemap = PageSitemap(lambda request: Page.objects.filter(language_code="de"))
+    shard = content(sitemap.shard(request, 1))
+    assert len(re.findall(r"<loc>", shard)) == 4
+    assert "hreflang" not in shard
+
+
+@pytest.mark.django_db
+def test_sitemap_location():
+    """Subclasses may build locations from additional fields"""
+    Page.objects.create(title="home", slug="home", path="/", static_path=True)
+
+    class TitleSitemap(PageSitemap):
+        location_fields = ["path", "title"]
+
+        def location(self, request, row):
+            return f"https://{row['title']}.example.com{row['path']}"
+
+    request = RequestFactory().get("/sitemap-1.xml")
+    shard = content(TitleSitemap(Page.objects.all()).shard(request, 1))
+    assert re.findall(r"<loc>([^<]+)</loc>", shard) == ["https://home.example.com/"]
@@ -5,9 +5,11 @@ import pytest
 from django.template import Context, Template
 from django.test import RequestFactory
 from django.test.utils import override_settings
+from django.utils.module_loading import import_string
 from pytest_django.asserts import assertHTMLEqual
 
-from feincms3.shortcuts import render_list
+from feincms3 import utils
+from feincms3.shortcuts import render_detail, render_list
 from feincms3.utils import is_first_party_link, upload_to
 from testapp.models import Article
 
@@ -101,3 +103,65 @@ def test_render_list():
     assert len(response.context_data["object_list"]) == 2
     assert response.context_data["object_list"].number == 2
     assert response.context_data["object_list"].paginator.num_pages == 4
+
+
+@pytest.mark.django_db
+def test_render_conditional():
+    """render_detail and render_list support conditional requests"""
+    article = Article.objects.create(title="Article", category="publications")
+    factory = RequestFactory()
+
+    response = render_detail(factory.get("/"), article, etag="a")
+    assert response["ETag"] == '"a"'
+    assert "Last-Modified" not in response
+    response = render_detail(
+        factory.get("/", headers={"If-None-Match": '"a"'}), article, etag="a"
+    )
+    assert response.status_code == 304
+    response = render_detail(
+        factory.get("/", headers={"If-None-Match": '"b"'}), article, etag="a"
+    )
+    assert response.template_name == "testapp/article_detail.html"
+
+    modified = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+    response = render_list(
+        factory.get("/"),
+        Article.objects.all(),
+        last_modified=lambda request, queryset: modified,
+    )
+    assert response["Last-Modified"] == "Thu, 01 Jan 2026 00:00:00 GMT"
+    request = factory.get("/", headers={"If-Modified-Since": response["Last-Modified"]})
+    response = render_list(request, Article.objects.all(), last_modified=modified)
+    assert response.status_code == 304
+
+    response = render_detail(
+        factory.post("/", headers={"If-None-Match": '"a"'}), article, etag="a"
+    )
+    assert "ETag" not in response
+
+
+metrics = []
+
+
+def record_metric(name, value, **tags):
+    metrics.append((name, value, tags))
+
+
+def test_metrics_hook_import(monkeypatch, settings):
+    """Dotted paths to the metrics hook are only imported once"""
+    imports = []
+
+    def counting_import_string(path):
+        imports.append(path)
+        return import_string(path)
+
+    monkeypatch.setattr(utils, "import_string", counting_import_string)
+    settings.FEINCMS3_METRICS_HOOK = "testapp.test_utils.record_metric"
+    utils.metric("a")
+    utils.metric("b", 2, tag="c")
+    assert utils.metrics_enabled()
+    assert metrics[-2:] == [("a", 1, {}), ("b", 2, {"tag": "c"})]
+    assert imports == ["testapp.test_utils.record_metric"]
+
+    settings.FEINCMS3_METRICS_HOOK = None
+    assert not utils.metrics_enabled()